@@ -0,0 +1,46 @@
+from django.db import models
+
+
+class Author(models.Model):
+    name = models.CharField(max_length=100, db_index=True)
+    country = models.CharField(max_length=2)
+
+    def __str__(self):
+        return self.name
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50)
+
+    def __str__(self):
+        return self.name
+
+
+class Post(models.Model):
+    STATUS_CHOICES = (('d', 'Draft'), ('p', 'Published'), ('a', 'Archived'))
+
+    title = models.CharField(max_length=200, db_index=True)
+    body = models.TextField(default='')
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES,
+                              default='d')
+    views = models.IntegerField(default=0)
+    rating = models.FloatField(default=0)
+    published = models.BooleanField(default=False)
+    created = models.DateTimeField()
+    day = models.DateField()
+    at = models.TimeField()
+    author = models.ForeignKey(Author, on_delete=models.CASCADE,
+                               related_name='posts')
+    tags = models.ManyToManyField(Tag, blank=True)
+
+    def __str__(self):
+        return self.title
+
+
+class Comment(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='comments')
+    text = models.CharField(max_length=200)
+
+    def __str__(self):
+        return self.text
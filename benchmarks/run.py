@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+"""
+    Benchmarks of the Django backend hot paths.
+
+    Creates a Flask application and the models of `benchapp` on SQLite, or
+    PostgreSQL with `--postgres`, fills them with generated rows and times
+    list pages, searches, filters, AJAX lookups, mass delete, inline saves
+    and view scaffolding. Results are written as JSON, so that runs can be
+    compared over time::
+
+        python benchmarks/run.py --rows 100000 --output before.json
+
+    PostgreSQL connection parameters are read from the usual `PGHOST`,
+    `PGPORT`, `PGUSER` and `PGPASSWORD` environment variables. Tables are
+    dropped and created by every run.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf',
+         'hotel', 'india', 'juliet', 'kilo', 'lima', 'mike', 'november')
+COUNTRIES = ('ng', 'gh', 'ke', 'za', 'us', 'gb', 'de', 'fr')
+
+
+def setup_django(args):
+    import django
+    from django.conf import settings
+
+    if args.postgres:
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': args.postgres,
+        }
+    else:
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': args.sqlite,
+        }
+
+    settings.configure(
+        INSTALLED_APPS=['benchapp'],
+        DATABASES={'default': database},
+        DEFAULT_AUTO_FIELD='django.db.models.AutoField',
+        USE_TZ=False)
+    django.setup()
+
+
+def create_tables():
+    from django.apps import apps
+    from django.db import connection
+
+    models = list(apps.get_app_config('benchapp').get_models())
+
+    with connection.schema_editor() as editor:
+        for model in reversed(models):
+            for field in model._meta.local_many_to_many:
+                through = field.remote_field.through
+                if through._meta.db_table in connection.introspection.table_names():
+                    editor.delete_model(through)
+
+            if model._meta.db_table in connection.introspection.table_names():
+                editor.delete_model(model)
+
+        for model in models:
+            editor.create_model(model)
+
+
+def generate(rows, batch_size=10000):
+    from benchapp.models import Author, Tag, Post, Comment
+
+    rnd = random.Random(42)
+    start = datetime.datetime(2020, 1, 1)
+
+    Author.objects.bulk_create([
+        Author(name='%s %s %d' % (rnd.choice(WORDS), rnd.choice(WORDS), i),
+               country=rnd.choice(COUNTRIES))
+        for i in range(max(rows // 100, 10))
+    ], batch_size=batch_size)
+    Tag.objects.bulk_create([Tag(name=word) for word in WORDS])
+
+    author_ids = list(Author.objects.values_list('pk', flat=True))
+
+    for offset in range(0, rows, batch_size):
+        posts = []
+
+        for i in range(offset, min(offset + batch_size, rows)):
+            created = start + datetime.timedelta(minutes=i * 7)
+            posts.append(Post(
+                title='%s %s %d' % (rnd.choice(WORDS), rnd.choice(WORDS), i),
+                body=' '.join(rnd.choice(WORDS) for _ in range(50)),
+                status=rnd.choice('dpa'),
+                views=rnd.randint(0, 10000),
+                rating=rnd.random() * 5,
+                published=rnd.random() > 0.5,
+                created=created,
+                day=created.date(),
+                at=created.time(),
+                author_id=rnd.choice(author_ids)))
+
+        Post.objects.bulk_create(posts)
+
+    post_ids = list(Post.objects.values_list('pk', flat=True)[:rows // 10])
+
+    Comment.objects.bulk_create([
+        Comment(post_id=post_id, text='comment %d' % i)
+        for i, post_id in enumerate(post_ids)
+    ], batch_size=batch_size)
+
+
+def create_app():
+    from flask import Flask
+    from flask_admin import Admin
+
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+
+    return app, Admin(app)
+
+
+def get_views():
+    from contrib_django.view import DjangoModelView
+    from contrib_django.form import ColumnModelConverter
+    from benchapp.models import Comment
+
+    class PostView(DjangoModelView):
+        model_form_converter = ColumnModelConverter
+        column_list = ['title', 'status', 'views', 'published', 'created',
+                       'author']
+        column_searchable_list = ['title']
+        column_filters = ['title', 'status', 'views', 'rating', 'published',
+                          'created', 'day', 'at', 'author.name',
+                          'comments__text']
+        form_ajax_refs = {'author': {'fields': ['name']}}
+        inline_models = [Comment]
+        action_set_fields_list = ['status']
+
+    class KeysetPostView(PostView):
+        pagination_mode = 'keyset'
+
+    return PostView, KeysetPostView
+
+
+class Runner(object):
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, name, func, setup=None, repeat=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        timings = []
+        queries = None
+
+        for i in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+
+            if queries is None:
+                queries = len(ctx.captured_queries)
+
+        result = {
+            'name': name,
+            'repeat': len(timings),
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.mean(timings),
+            'max': max(timings),
+            'queries': queries,
+        }
+        self.results.append(result)
+
+        sys.stderr.write('%-50s %10.3f ms %5d queries\n' %
+                         (name, result['median'] * 1000, queries))
+        return result
+
+
+def get_filter_value(flt):
+    from flask_admin.model import filters
+
+    if isinstance(flt, filters.BaseBooleanFilter):
+        return '1'
+
+    if isinstance(flt, (filters.BaseDateBetweenFilter,
+                        filters.BaseDateTimeBetweenFilter)):
+        return '2020-01-01 00:00:00 to 2020-06-01 00:00:00' if isinstance(
+            flt, filters.BaseDateTimeBetweenFilter) else \
+            '2020-01-01 to 2020-06-01'
+
+    if isinstance(flt, filters.BaseTimeBetweenFilter):
+        return '08:00:00 to 12:00:00'
+
+    if isinstance(flt, filters.BaseDateTimeFilter):
+        return '2020-03-01 00:00:00'
+
+    if isinstance(flt, filters.BaseDateFilter):
+        return '2020-03-01'
+
+    if isinstance(flt, filters.BaseTimeFilter):
+        return '10:00:00'
+
+    if isinstance(flt, (filters.BaseIntFilter, filters.BaseIntListFilter)):
+        return '100,200' if 'list' in flt.operation() else '5000'
+
+    if isinstance(flt, (filters.BaseFloatFilter,
+                        filters.BaseFloatListFilter)):
+        return '1.5,2.5' if 'list' in flt.operation() else '2.5'
+
+    if flt.options:
+        return 'p'
+
+    return 'alpha'
+
+
+def bench_startup(runner, app, admin):
+    from contrib_django.scaffold import clear_scaffold_cache
+    from benchapp.models import Post
+
+    PostView, _ = get_views()
+
+    class LazyPostView(PostView):
+        lazy_scaffold = True
+
+    counter = [0]
+
+    def create(view_class, cached):
+        def func():
+            if not cached:
+                clear_scaffold_cache()
+
+            counter[0] += 1
+            view_class(Post, endpoint='startup%d' % counter[0])
+
+        return func
+
+    runner.run('startup/scaffold', create(PostView, False))
+    runner.run('startup/scaffold_shared', create(PostView, True))
+    runner.run('startup/lazy', create(LazyPostView, False))
+
+
+def bench_list(runner, app, view, keyset_view, rows):
+    page_size = view.page_size
+    last_page = max(rows // page_size - 1, 0)
+
+    for page in (0, last_page // 2, last_page):
+        def func(page=page):
+            with app.test_request_context('/'):
+                view.get_list(page, 'views', False, None, [])
+
+        runner.run('get_list/offset/page_%d' % page, func)
+
+    # Keyset page reached through the cursor of the previous page
+    if last_page > 0:
+        bench_keyset(runner, app, view, keyset_view, last_page)
+    else:
+        sys.stderr.write('Skipped keyset pagination, --rows is below two '
+                         'pages\n')
+
+    def search():
+        with app.test_request_context('/'):
+            view.get_list(0, None, False, 'alpha', [])
+
+    runner.run('get_list/search', search)
+
+    for idx, flt in enumerate(view._filters):
+        value = get_filter_value(flt)
+
+        def func(idx=idx, flt=flt, value=value):
+            with app.test_request_context('/'):
+                view.get_list(0, None, False, None,
+                              [(idx, flt.name, value)])
+
+        runner.run('get_list/filter/%s/%s' % (flt.column, flt.operation()),
+                   func)
+
+
+def bench_keyset(runner, app, view, keyset_view, page):
+    from contrib_django.pagination import (encode_cursor, get_list_state,
+                                           get_keyset_fields)
+
+    # Cursor of the last row of the previous page
+    keys = get_keyset_fields(keyset_view.model, [('views', False)])
+    state = get_list_state('views', False, None, [], view.page_size)
+
+    with app.test_request_context('/'):
+        _, data = view.get_list(page - 1, 'views', False, None, [])
+        last = list(data)[-1]
+
+    cursor = encode_cursor(page, 'next',
+                           [getattr(last, attname) for attname, _, _ in keys],
+                           state)
+
+    def keyset():
+        with app.test_request_context('/?%s=%s' %
+                                      (keyset_view.keyset_cursor_arg, cursor)):
+            keyset_view.get_list(page, 'views', False, None, [])
+
+    runner.run('get_list/keyset/page_%d' % page, keyset)
+
+
+def bench_ajax(runner, app, view):
+    loader = view._form_ajax_refs['author']
+
+    def first():
+        with app.test_request_context('/'):
+            loader.get_list('alpha', 0, 10)
+
+    def more():
+        with app.test_request_context('/'):
+            loader.get_list('alpha', 10, 10)
+
+    runner.run('ajax/get_list', first)
+    runner.run('ajax/get_list_more', more)
+
+
+def bench_delete(runner, app, view, rows):
+    from benchapp.models import Post
+
+    size = min(max(rows // 100, 10), 1000)
+    ids = []
+
+    def setup():
+        author_id = Post.objects.values_list('author_id', flat=True)[0]
+        now = datetime.datetime(2020, 1, 1)
+        Post.objects.bulk_create([
+            Post(title='delete %d' % i, created=now, day=now.date(),
+                 at=now.time(), author_id=author_id)
+            for i in range(size)
+        ])
+        ids[:] = [str(pk) for pk in Post.objects.filter(
+            title__startswith='delete ').values_list('pk', flat=True)]
+
+    def delete():
+        with app.test_request_context('/'):
+            view.action_delete(ids)
+
+    runner.run('action_delete/%d' % size, delete, setup=setup)
+
+    fast = type(view)(Post, endpoint='fast_delete')
+    fast.fast_mass_delete = True
+
+    def fast_delete():
+        with app.test_request_context('/'):
+            fast.action_delete(ids)
+
+    runner.run('action_delete_fast/%d' % size, fast_delete, setup=setup)
+
+
+def bench_inline(runner, app, view, children):
+    from benchapp.models import Post, Comment
+
+    post = Post.objects.order_by('pk').first()
+    Comment.objects.filter(post=post).delete()
+    Comment.objects.bulk_create([Comment(post=post, text='child %d' % i)
+                                 for i in range(children)])
+
+    client = app.test_client()
+    url = '/admin/%s/edit/?id=%s' % (view.endpoint, post.pk)
+    counter = [0]
+
+    def save():
+        counter[0] += 1
+
+        data = {'title': post.title, 'body': post.body,
+                'status': post.status, 'views': str(post.views),
+                'rating': str(post.rating),
+                'created': post.created.strftime('%Y-%m-%d %H:%M:%S'),
+                'day': post.day.isoformat(),
+                'at': post.at.strftime('%H:%M:%S'),
+                'author': str(post.author_id)}
+        if post.published:
+            data['published'] = 'y'
+
+        texts = {}
+        for i, pk in enumerate(Comment.objects.filter(
+                post=post).order_by('pk').values_list('pk', flat=True)):
+            texts[pk] = 'child %d %d' % (i, counter[0]) \
+                if i % 2 else 'child %d' % i
+            data['comments-%d-id' % i] = str(pk)
+            data['comments-%d-text' % i] = texts[pk]
+
+        response = client.post(url, data=data)
+
+        # A form error renders the page again instead of saving
+        assert response.status_code == 302, response.status_code
+        assert dict(Comment.objects.filter(post=post).values_list(
+            'pk', 'text')) == texts, 'inline rows were not saved'
+
+    runner.run('inline_save/%d' % children, save)
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='number of generated posts')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timed runs per benchmark')
+    parser.add_argument('--sqlite', default=':memory:',
+                        help='SQLite database file')
+    parser.add_argument('--postgres', metavar='NAME',
+                        help='run on the PostgreSQL database NAME')
+    parser.add_argument('--inline-children', type=int, default=200,
+                        help='number of inline rows saved at once')
+    parser.add_argument('--output', help='write JSON results to a file')
+    args = parser.parse_args()
+
+    setup_django(args)
+
+    from django.db import connection
+    import django
+    import flask_admin
+
+    create_tables()
+
+    started = time.perf_counter()
+    generate(args.rows)
+    sys.stderr.write('Generated %d rows in %.1fs\n' %
+                     (args.rows, time.perf_counter() - started))
+
+    from benchapp.models import Post
+
+    app, admin = create_app()
+    PostView, KeysetPostView = get_views()
+
+    view = PostView(Post)
+    keyset_view = KeysetPostView(Post, endpoint='keyset')
+    admin.add_view(view)
+    admin.add_view(keyset_view)
+
+    runner = Runner(args.repeat)
+
+    bench_startup(runner, app, admin)
+    bench_list(runner, app, view, keyset_view, args.rows)
+    bench_ajax(runner, app, view)
+    bench_delete(runner, app, view, args.rows)
+    bench_inline(runner, app, view, args.inline_children)
+
+    output = json.dumps({
+        'meta': {
+            'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+            'revision': get_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'flask_admin': flask_admin.__version__,
+            'database': connection.vendor,
+            'rows': args.rows,
+            'repeat': args.repeat,
+        },
+        'results': runner.results,
+    }, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+import logging
+import os
+import re
+from collections import OrderedDict
+
+import click
+from flask.cli import with_appcontext
+from flask_admin._compat import iteritems, string_types
+from django.db import connections, migrations, models, DatabaseError
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from .search import LikeSearchBackend
+from .tools import get_lookup_field
+
+log = logging.getLogger("flask-admin.django")
+
+# Kinds of advice an index on the column would fix
+INDEXABLE_KINDS = ('default_sort', 'sort', 'filter')
+
+# Filter lookups a B-tree index can not serve
+UNINDEXABLE_LOOKUPS = ('contains', 'icontains', 'endswith', 'iendswith')
+
+
+class IndexAdvice(object):
+    """
+        Finding of the index advisor.
+    """
+
+    def __init__(self, endpoint, kind, message, model=None, field=None):
+        """
+            Constructor.
+
+            :param endpoint:
+                View endpoint
+            :param kind:
+                One of `default_sort`, `sort`, `filter`, `search` or `scan`
+            :param message:
+                Human readable description
+            :param model:
+                Model owning the unindexed column
+            :param field:
+                Unindexed model field
+        """
+        self.endpoint = endpoint
+        self.kind = kind
+        self.message = message
+        self.model = model
+        self.field = field
+
+    def __str__(self):
+        return '%s: %s' % (self.endpoint, self.message)
+
+    def __repr__(self):
+        return '<IndexAdvice %s %s>' % (self.kind, self)
+
+
+def get_indexed_columns(model):
+    """
+        Return names of the fields of `model` leading an index: primary
+        key, unique, `db_index` and foreign key fields, and the first field
+        of `Meta.indexes`, `unique_together`, `index_together` and
+        unconditional unique constraints.
+    """
+    opts = model._meta
+    result = set()
+
+    for field in opts.local_concrete_fields:
+        if field.primary_key or field.unique or field.db_index:
+            result.add(field.name)
+
+    for index in opts.indexes:
+        if index.fields:
+            result.add(index.fields[0].lstrip('-'))
+
+    # Meta.index_together was removed in Django 5.1
+    index_together = getattr(opts, 'index_together', ())
+
+    for fields in list(opts.unique_together) + list(index_together):
+        if fields:
+            result.add(fields[0])
+
+    for constraint in opts.constraints:
+        if (isinstance(constraint, models.UniqueConstraint) and
+                constraint.condition is None and constraint.fields):
+            result.add(constraint.fields[0])
+
+    return result
+
+
+def _resolve_field(model, column):
+    if not isinstance(column, string_types):
+        return getattr(column, 'field', column)
+
+    resolved = get_lookup_field(model, column)
+    return resolved[0] if resolved is not None else None
+
+
+def check_view(view):
+    """
+        Check sortable columns, the default sort, filter columns and
+        searchable columns of the view against the indexes of their
+        models.
+
+        :param view:
+            `DjangoModelView` instance
+    """
+    view.ensure_scaffolded()
+
+    result = []
+    seen = set()
+
+    def check(kind, column, label):
+        field = _resolve_field(view.model, column)
+
+        if (field is None or not field.concrete or field.many_to_many or
+                (kind, field) in seen):
+            return
+
+        seen.add((kind, field))
+
+        if field.name in get_indexed_columns(field.model):
+            return
+
+        result.append(IndexAdvice(
+            view.endpoint, kind,
+            '%s column %s.%s is not indexed' % (
+                label, field.model._meta.label, field.name),
+            field.model, field))
+
+    for column, _ in view._get_list_ordering(None, False)[:1]:
+        check('default_sort', column, 'Default sort')
+
+    for name, column in iteritems(view._sortable_columns or {}):
+        check('sort', name if isinstance(column, string_types) else column,
+              'Sortable')
+
+    for flt in view._filters or ():
+        if getattr(flt, 'lookup', None) not in UNINDEXABLE_LOOKUPS:
+            check('filter', flt.column, 'Filter')
+
+    if view._search_fields and isinstance(view._search_backend,
+                                          LikeSearchBackend):
+        result.append(IndexAdvice(
+            view.endpoint, 'search',
+            'Search on %s uses LIKE, which scans the table; consider '
+            'search_backend "postgres" or "fts5"' %
+            ', '.join(str(name) for name in view._search_fields)))
+
+    return result
+
+
+def _find_full_scans_postgresql(plan):
+    if not re.search(r'\bSort\b', plan) and 'Filter:' not in plan:
+        return []
+
+    return re.findall(r'Seq Scan on \S+', plan)
+
+
+def _find_full_scans_sqlite(plan):
+    scans = []
+
+    for line in plan.splitlines():
+        match = re.search(r'\bSCAN (?:TABLE )?(\w+)(.*)', line)
+
+        if match and 'USING' not in match.group(2):
+            scans.append('SCAN %s' % match.group(1))
+
+    # A scan stopped early by LIMIT is cheap, unless rows are sorted first
+    if 'TEMP B-TREE' not in plan:
+        return []
+
+    return scans
+
+
+_scan_finders = {
+    'postgresql': _find_full_scans_postgresql,
+    'sqlite': _find_full_scans_sqlite,
+}
+
+
+def explain_view(view, search_term='a'):
+    """
+        Run `EXPLAIN` on list queries of the view, sorted by default and by
+        every sortable column and searched with `search_term`, and report
+        the ones that scan and sort, or scan and filter, a whole table.
+        Supported on PostgreSQL and SQLite.
+
+        Plans depend on table statistics, so run it against a database
+        with production-like data.
+
+        :param view:
+            `DjangoModelView` instance
+        :param search_term:
+            Search term of the search query
+    """
+    view.ensure_scaffolded()
+
+    queries = [('Default list', None, None)]
+    queries.extend(('Sort by %s' % name, name, None)
+                   for name in view._sortable_columns or {})
+
+    if view._search_supported:
+        queries.append(('Search', None, search_term))
+
+    result = []
+
+    for label, sort_column, search in queries:
+        ordering = view._get_list_ordering(sort_column, False)
+        query = view._get_list_query(search, [])
+        query = view._order_by(view._apply_list_loading(query, ordering),
+                               ordering)[:view.page_size or 20]
+
+        finder = _scan_finders.get(connections[query.db].vendor)
+        if finder is None:
+            return result
+
+        try:
+            plan = query.explain()
+        except DatabaseError as ex:
+            log.warning('%s: failed to explain %s: %s', view.endpoint, label,
+                        ex)
+            continue
+
+        for scan in finder(plan):
+            result.append(IndexAdvice(
+                view.endpoint, 'scan',
+                '%s: EXPLAIN shows a full scan (%s)' % (label, scan)))
+
+    return result
+
+
+def advise_indexes(admin, explain=True, search_term='a'):
+    """
+        Run :func:`check_view` and, if `explain` is set,
+        :func:`explain_view` for every `DjangoModelView` registered in the
+        admin.
+
+        :param admin:
+            `flask_admin.Admin` instance
+        :param explain:
+            Run `EXPLAIN` on list queries
+        :param search_term:
+            Search term of explained search queries
+    """
+    from .view import DjangoModelView
+
+    result = []
+
+    for view in admin._views:
+        if not isinstance(view, DjangoModelView):
+            continue
+
+        result.extend(check_view(view))
+
+        if explain:
+            result.extend(explain_view(view, search_term))
+
+    return result
+
+
+def get_index_migrations(advice, name='admin_indexes'):
+    """
+        Build one migration per app adding a single column index for every
+        unindexed sort and filter column of the advice. Apps without
+        migrations and unmanaged models are skipped.
+
+        Indexes are only created in the database, not added to the model
+        state, so that `makemigrations` does not remove them again. Move
+        them to `Meta.indexes` to make them part of the models.
+
+        Returns a list of `(path, source)` tuples.
+
+        :param advice:
+            List of :class:`IndexAdvice`
+        :param name:
+            Migration name, after its number
+    """
+    operations = OrderedDict()
+    seen = set()
+
+    for item in advice:
+        if item.field is None or item.kind not in INDEXABLE_KINDS:
+            continue
+
+        opts = item.model._meta
+
+        if not opts.managed or (item.model, item.field.name) in seen:
+            continue
+
+        seen.add((item.model, item.field.name))
+
+        index = models.Index(fields=[item.field.name])
+        index.set_name_with_model(item.model)
+
+        operations.setdefault(opts.app_label, []).append(
+            migrations.SeparateDatabaseAndState(database_operations=[
+                migrations.AddIndex(opts.model_name, index)]))
+
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    result = []
+
+    for app_label, app_operations in iteritems(operations):
+        leaves = loader.graph.leaf_nodes(app_label)
+
+        if not leaves:
+            log.warning('App %s has no migrations, add the indexes to '
+                        'Meta.indexes instead', app_label)
+            continue
+
+        number = max(MigrationAutodetector.parse_number(leaf_name) or 0
+                     for _, leaf_name in leaves) + 1
+
+        migration = migrations.Migration('%04d_%s' % (number, name),
+                                         app_label)
+        migration.dependencies = leaves
+        migration.operations = app_operations
+
+        writer = MigrationWriter(migration)
+        result.append((writer.path, writer.as_string()))
+
+    return result
+
+
+def create_advisor_command(admin, name='index-advisor'):
+    """
+        Return a Flask CLI command running the index advisor over the views
+        of the admin::
+
+            app.cli.add_command(create_advisor_command(admin))
+
+        and then::
+
+            flask index-advisor [--no-explain] [--emit-migrations]
+
+        :param admin:
+            `flask_admin.Admin` instance
+        :param name:
+            Command name
+    """
+
+    @click.command(name, help='Report admin list queries missing indexes.')
+    @click.option('--explain/--no-explain', default=True,
+                  help='Run EXPLAIN on representative list queries.')
+    @click.option('--search-term', default='a',
+                  help='Term of the explained search queries.')
+    @click.option('--emit-migrations', is_flag=True,
+                  help='Write migrations adding the missing indexes.')
+    @with_appcontext
+    def command(explain, search_term, emit_migrations):
+        advice = advise_indexes(admin, explain, search_term)
+
+        for item in advice:
+            click.echo(str(item))
+
+        if not advice:
+            click.echo('No missing indexes found.')
+
+        if emit_migrations:
+            for path, source in get_index_migrations(advice):
+                with open(path, 'w') as fp:
+                    fp.write(source)
+
+                click.echo('Created %s' % os.path.relpath(path))
+
+    return command
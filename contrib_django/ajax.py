@@ -1,22 +1,70 @@
-from flask_admin._compat import as_unicode, string_types
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context
+from flask_admin._compat import as_unicode, string_types, itervalues, iteritems
 from flask_admin.model.ajax import AjaxModelLoader, DEFAULT_PAGE_SIZE
+from flask_admin.model.fields import AjaxSelectField, AjaxSelectMultipleField
+from wtforms.form import BaseForm
 
+from .pagination import get_keyset_fields, get_seek_filter
+from .routing import get_read_alias
 from .tools import get_primary_key
+from django.core.exceptions import FieldDoesNotExist
 from django.db.models import Q
 
 
+def get_identity_map(model):
+    """
+        Return request-scoped dictionary of primary key (as text) to model
+        instance, shared by all loaders of the model. Outside of a request
+        an empty dictionary is returned.
+    """
+    if not has_request_context():
+        return {}
+
+    if not hasattr(g, '_admin_identity_map'):
+        g._admin_identity_map = {}
+
+    return g._admin_identity_map.setdefault(model, {})
+
+
 class QueryAjaxModelLoader(AjaxModelLoader):
+    max_continuations = 1000
+    """
+        Number of "load more" positions remembered per loader.
+    """
+
+    continuation_ttl = 60
+    """
+        Number of seconds a "load more" position is reused.
+    """
+
     def __init__(self, name, model, **options):
         """
             Constructor.
 
             :param fields:
                 Fields to run query against
+            :param order_by:
+                Field to sort results by within each match group. Defaults
+                to the first of `fields`.
+            :param read_using:
+                Database alias, or callable taking the model and returning
+                one, used for lookups. Resolving submitted values stays on
+                the default database.
+            :param read_after_write_window:
+                Number of seconds lookups stay on the default database
+                after the session has written to it
         """
         super(QueryAjaxModelLoader, self).__init__(name, options)
 
         self.model = model
         self.fields = options.get('fields')
+        self.order_by = options.get('order_by')
+        self.read_using = options.get('read_using')
+        self.read_after_write_window = options.get('read_after_write_window')
 
         if not self.fields:
             raise ValueError(
@@ -27,20 +75,25 @@ class QueryAjaxModelLoader(AjaxModelLoader):
 
         self.pk = get_primary_key(model)
 
+        self._keys = get_keyset_fields(
+            model, [(self.order_by or self._cached_fields[0], False)])
+        self._continuations = OrderedDict()
+        self._lock = threading.Lock()
+
     def _process_fields(self):
         remote_fields = []
 
         for field in self.fields:
-            if isinstance(field, string_types):
-                attr = getattr(self.model, field, None)
+            if not isinstance(field, string_types):
+                field = field.field.name
 
-                if not attr:
-                    raise ValueError('%s.%s does not exist.' %
-                                     (self.model, field))
+            try:
+                self.model._meta.get_field(field)
+            except FieldDoesNotExist:
+                raise ValueError('%s.%s does not exist.' %
+                                 (self.model, field))
 
-                remote_fields.append(attr)
-            else:
-                remote_fields.append(field)
+            remote_fields.append(field)
 
         return remote_fields
 
@@ -50,27 +103,254 @@ class QueryAjaxModelLoader(AjaxModelLoader):
 
         return (getattr(model, self.pk), as_unicode(model))
 
+    def get_query(self):
+        return self.model._default_manager.all()
+
+    def get_lookup_query(self):
+        """
+            Return the query of autocomplete lookups, on the read alias
+            when one is configured.
+        """
+        query = self.get_query()
+        alias = get_read_alias(self.read_using, self.model,
+                               self.read_after_write_window)
+
+        return query.using(alias) if alias else query
+
     def get_one(self, pk):
-        return self.model.get(**{self.pk: pk})
+        identity_map = get_identity_map(self.model)
+        key = as_unicode(pk)
 
-    def get_list(self, term, offset=0, limit=DEFAULT_PAGE_SIZE):
-        query = self.model.objects
+        if key not in identity_map:
+            identity_map[key] = self.get_query().filter(pk=pk).first()
+
+        return identity_map[key]
+
+    def get_many(self, pks):
+        """
+            Return models for the primary keys, in the same order, skipping
+            missing ones. Models not yet in the request identity map are
+            loaded with a single query.
+
+            :param pks:
+                Iterable of primary keys
+        """
+        identity_map = get_identity_map(self.model)
+        keys = [as_unicode(pk) for pk in pks]
+        missing = set(key for key in keys if key not in identity_map)
 
+        if missing:
+            for model in self.get_query().filter(pk__in=missing):
+                identity_map[as_unicode(model.pk)] = model
+
+            for key in missing:
+                identity_map.setdefault(key, None)
+
+        return [identity_map[key] for key in keys
+                if identity_map[key] is not None]
+
+    def _get_filter(self, lookup, term):
         stmt = None
+
         for field in self._cached_fields:
-            q = Q(**{"{}__icontains".format(field): term})
+            q = Q(**{"{}__{}".format(field, lookup): term})
 
             if stmt is None:
                 stmt = q
             else:
                 stmt |= q
 
-        query = query.filter(stmt).all()
+        return stmt
+
+    def get_match_filters(self, term):
+        """
+            Return filters of the match groups, in rank order. Prefix
+            matches come first, as `istartswith` can be served by an index,
+            followed by the remaining `icontains` matches.
+        """
+        prefix = self._get_filter('istartswith', term)
+
+        if not term:
+            return [prefix]
+
+        return [prefix, self._get_filter('icontains', term) & ~prefix]
+
+    def _get_ordering(self):
+        if self._keys is None:
+            return [self.order_by or self._cached_fields[0], self.pk]
 
-        if offset:
-            query = query[limit:offset]
+        return [attname for attname, _, _ in self._keys]
 
-        return query
+    def _get_continuation(self, term, offset, filters):
+        with self._lock:
+            entry = self._continuations.get((term, offset))
+
+        if entry is None:
+            return None
+
+        expires, group, pk, values = entry
+
+        # Positions are shared by all clients of the process. Only seek
+        # from a row that is unchanged and still in its match group, so
+        # the page holds the rows OFFSET would return; otherwise fall back
+        # to OFFSET, like workers that do not have the position.
+        if expires > time.time() and group < len(filters):
+            current = self.get_lookup_query().filter(
+                filters[group], pk=pk).values_list(
+                *[attname for attname, _, _ in self._keys]).first()
+
+            if current is not None and list(current) == values:
+                return group, values
+
+        with self._lock:
+            if self._continuations.get((term, offset)) is entry:
+                del self._continuations[(term, offset)]
+
+        return None
+
+    def _set_continuation(self, term, offset, group, row):
+        values = [getattr(row, attname) for attname, _, _ in self._keys]
+        entry = (time.time() + self.continuation_ttl, group, row.pk, values)
+
+        with self._lock:
+            self._continuations[(term, offset)] = entry
+            self._continuations.move_to_end((term, offset))
+
+            while len(self._continuations) > self.max_continuations:
+                self._continuations.popitem(last=False)
+
+    def get_list(self, term, offset=0, limit=DEFAULT_PAGE_SIZE):
+        """
+            Return up to `limit` models matching the term, ranked by match
+            group, with LIMIT applied in SQL.
+
+            "Load more" requests continue from the last row of the previous
+            page with a seek predicate when this loader served it less than
+            :attr:`continuation_ttl` seconds ago and that row did not change
+            since, otherwise they fall back to OFFSET.
+        """
+        term = term or ''
+        offset = offset or 0
+        filters = self.get_match_filters(term)
+
+        position = None
+        if offset and self._keys is not None:
+            position = self._get_continuation(term, offset, filters)
+
+        skip = offset if position is None else 0
+        result = []
+
+        for group, stmt in enumerate(filters):
+            remaining = limit - len(result)
+
+            if remaining <= 0:
+                break
+
+            if position is not None and group < position[0]:
+                continue
+
+            query = self.get_lookup_query().filter(stmt).order_by(
+                *self._get_ordering())
+
+            if position is not None and group == position[0]:
+                query = query.filter(get_seek_filter(self._keys, position[1]))
+
+            rows = list(query[skip:skip + remaining])
+
+            if skip and not rows:
+                skip -= query.count()
+                continue
+
+            skip = 0
+            result.extend((group, row) for row in rows)
+
+        if result and len(result) == limit and self._keys is not None:
+            group, row = result[-1]
+            self._set_continuation(term, offset + limit, group, row)
+
+        return [row for _, row in result]
+
+
+def _collect_ajax_pks(form, result):
+    for field in itervalues(form._fields):
+        if isinstance(field, AjaxSelectMultipleField):
+            pks = [pk for pk in field._formdata or () if pk]
+        elif isinstance(field, AjaxSelectField):
+            pks = [field._formdata] if field._formdata else []
+        else:
+            for entry in getattr(field, 'entries', ()):
+                if hasattr(entry, 'form'):
+                    _collect_ajax_pks(entry.form, result)
+
+            if isinstance(getattr(field, 'form', None), BaseForm):
+                _collect_ajax_pks(field.form, result)
+
+            continue
+
+        if pks and isinstance(field.loader, QueryAjaxModelLoader):
+            loader, keys = result.setdefault(field.loader.model,
+                                             (field.loader, set()))
+            keys.update(pks)
+
+
+def prefetch_ajax_data(form):
+    """
+        Resolve submitted values of all AJAX fields of the form, including
+        inline forms, with one query per related model. Fields then find
+        their models in the request identity map.
+
+        :param form:
+            Form instance
+    """
+    result = {}
+    _collect_ajax_pks(form, result)
+
+    for loader, pks in itervalues(result):
+        loader.get_many(pks)
+
+
+def prefetch_ajax_relations(loaders, objs):
+    """
+        Attach models referenced by AJAX foreign keys of `objs`, loading
+        them with one query per related model through the request identity
+        map, instead of one query per object and field.
+
+        :param loaders:
+            Dictionary of field name to loader
+        :param objs:
+            List of model instances of the same model
+    """
+    if not objs:
+        return
+
+    for name, loader in iteritems(loaders):
+        if not isinstance(loader, QueryAjaxModelLoader):
+            continue
+
+        try:
+            field = objs[0]._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+
+        if not field.concrete or not (field.many_to_one or field.one_to_one):
+            continue
+
+        pending = [obj for obj in objs
+                   if not field.is_cached(obj) and
+                   getattr(obj, field.attname) is not None]
+
+        if not pending:
+            continue
+
+        loader.get_many(set(getattr(obj, field.attname) for obj in pending))
+        identity_map = get_identity_map(loader.model)
+
+        for obj in pending:
+            related = identity_map.get(
+                as_unicode(getattr(obj, field.attname)))
+
+            if related is not None:
+                field.set_cached_value(obj, related)
 
 
 def create_ajax_loader(model, name, field_name, options):
@@ -80,6 +360,10 @@ def create_ajax_loader(model, name, field_name, options):
         raise ValueError('Model %s does not have field %s.' %
                          (model, field_name))
 
-    # TODO: Check for field
-    remote_model = prop.rel_model
+    remote_model = model._meta.get_field(field_name).related_model
+
+    if remote_model is None:
+        raise ValueError('Field %s of model %s is not a relation.' %
+                         (field_name, model))
+
     return QueryAjaxModelLoader(name, remote_model, **options)
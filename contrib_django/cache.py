@@ -0,0 +1,281 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+
+class BaseCacheBackend(object):
+    """
+        Base cache backend.
+    """
+
+    def get(self, key):
+        """
+            Return cached value or None.
+        """
+        raise NotImplementedError()
+
+    def set(self, key, value, timeout):
+        """
+            Store value for `timeout` seconds.
+        """
+        raise NotImplementedError()
+
+    def get_counter(self, key):
+        """
+            Return value of a counter. Missing counters start from the
+            current time, so that a counter lost by the cache never
+            returns to a value used before.
+        """
+        raise NotImplementedError()
+
+    def incr_counter(self, key):
+        """
+            Increment counter.
+        """
+        raise NotImplementedError()
+
+
+class MemoryCacheBackend(BaseCacheBackend):
+    """
+        In-process LRU cache with bounded size. Every worker process has
+        its own copy, and invalidation is only seen by the process that
+        received the signal.
+    """
+
+    def __init__(self, max_entries=1000):
+        """
+            Constructor.
+
+            :param max_entries:
+                Maximum number of cached values
+        """
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.time() + timeout, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.setdefault(key, int(time.time() * 1000))
+
+    def incr_counter(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(
+                key, int(time.time() * 1000)) + 1
+
+
+class DjangoCacheBackend(BaseCacheBackend):
+    """
+        Store values in a Django cache, shared between worker processes
+        when the cache is (Redis, Memcached, database).
+    """
+
+    def __init__(self, alias='default', prefix='flask_admin_django'):
+        """
+            Constructor.
+
+            :param alias:
+                Name of the cache in Django `CACHES` setting
+            :param prefix:
+                Key prefix
+        """
+        self.alias = alias
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+
+        return caches[self.alias]
+
+    def _make_key(self, key):
+        return '%s:%s' % (self.prefix, key)
+
+    def get(self, key):
+        return self.cache.get(self._make_key(key))
+
+    def set(self, key, value, timeout):
+        self.cache.set(self._make_key(key), value, timeout)
+
+    def get_counter(self, key):
+        key = self._make_key(key)
+        value = self.cache.get(key)
+
+        if value is None:
+            self.cache.add(key, int(time.time() * 1000), None)
+            value = self.cache.get(key)
+
+        return value
+
+    def incr_counter(self, key):
+        key = self._make_key(key)
+
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, int(time.time() * 1000), None)
+
+
+class ListCache(object):
+    """
+        Cache of list view pages.
+
+        Stores the count and the primary keys of every page, keyed by view
+        and list state. Rows are still loaded from the database by primary
+        key, so cached pages never show stale values, only a stale
+        membership or order until the entry is invalidated.
+
+        Entries are versioned by a per-model generation counter bumped by
+        `post_save`, `post_delete` and `m2m_changed`, and by the view's
+        own create, update and delete helpers. Queryset `update()` and
+        raw SQL are only caught by the timeout.
+    """
+
+    def __init__(self, backend=None, timeout=300):
+        """
+            Constructor.
+
+            :param backend:
+                :class:`BaseCacheBackend` instance, defaults to
+                :class:`MemoryCacheBackend`
+            :param timeout:
+                Number of seconds a page is kept
+        """
+        self.backend = backend or MemoryCacheBackend()
+        self.timeout = timeout
+
+        self._bound = set()
+        self._lock = threading.Lock()
+
+    def bind(self, view):
+        """
+            Connect invalidation signals for the view model.
+        """
+        model = view.model
+
+        with self._lock:
+            if model in self._bound:
+                return
+
+            self._bound.add(model)
+
+        uid = 'flask_admin_django.cache.%s.%s' % (id(self),
+                                                  model._meta.label_lower)
+
+        post_save.connect(self._on_change, sender=model, weak=False,
+                          dispatch_uid=uid)
+        post_delete.connect(self._on_change, sender=model, weak=False,
+                            dispatch_uid=uid)
+
+        for field in model._meta.get_fields():
+            if field.many_to_many:
+                through = getattr(field, 'through', None)
+                if through is None:
+                    through = field.remote_field.through
+
+                m2m_changed.connect(
+                    self._on_m2m_change, sender=through, weak=False,
+                    dispatch_uid='%s.%s' % (uid, field.name))
+
+    def _on_change(self, sender, **kwargs):
+        self.invalidate(sender)
+
+    def _on_m2m_change(self, sender, instance, model, action, **kwargs):
+        if action.startswith('post_'):
+            self.invalidate(type(instance))
+            self.invalidate(model)
+
+    def _get_generation_key(self, model):
+        return 'gen:%s' % model._meta.label_lower
+
+    def invalidate(self, model):
+        """
+            Invalidate cached pages of a model.
+        """
+        self.backend.incr_counter(self._get_generation_key(model))
+
+    def _get_key(self, view, state, page):
+        generation = self.backend.get_counter(
+            self._get_generation_key(view.model))
+
+        key = '%s:%s:%s:%s' % (view.endpoint, state, page or 0, generation)
+        return 'list:%s' % hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def get(self, view, state, page):
+        """
+            Return `(count, pks)` tuple or None.
+
+            :param view:
+                Model view
+            :param state:
+                List state digest, see
+                :func:`~contrib_django.pagination.get_list_state`
+            :param page:
+                Page number
+        """
+        return self.backend.get(self._get_key(view, state, page))
+
+    def set(self, view, state, page, count, pks):
+        """
+            Store page.
+        """
+        self.backend.set(self._get_key(view, state, page), (count, pks),
+                         self.timeout)
+
+    def get_facets(self, view, state):
+        """
+            Return cached facet counts of a list state or None.
+        """
+        return self.backend.get(self._get_key(view, state, 'facets'))
+
+    def set_facets(self, view, state, facets):
+        """
+            Store facet counts of a list state.
+        """
+        self.backend.set(self._get_key(view, state, 'facets'), facets,
+                         self.timeout)
+
+
+def get_list_cache(cache):
+    """
+        Resolve `DjangoModelView.list_cache` into a :class:`ListCache`.
+    """
+    if cache is None or cache is False:
+        return None
+
+    if cache == 'memory':
+        return ListCache(MemoryCacheBackend())
+
+    if cache == 'django':
+        return ListCache(DjangoCacheBackend())
+
+    if isinstance(cache, ListCache):
+        return cache
+
+    raise ValueError('Unknown list cache: %r' % (cache, ))
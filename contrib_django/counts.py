@@ -0,0 +1,287 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from flask import copy_current_request_context, has_request_context
+from django.db import connections, close_old_connections, DatabaseError
+from django.db.models.signals import post_save, post_delete
+from flask_admin.babel import gettext
+
+from .metrics import get_recording, record_into
+from .pagination import get_list_state
+
+
+class ApproximateCount(int):
+    """
+        Row count coming from planner statistics rather than `COUNT(*)`.
+        Behaves like an integer for the pager, but renders as "about N".
+    """
+
+    def __str__(self):
+        return gettext('about %(count)s', count=int(self))
+
+
+class BaseCountStrategy(object):
+    """
+        Base count strategy.
+    """
+
+    def count(self, view, query, search, filters):
+        """
+            Return number of rows matched by the list query.
+
+            :param view:
+                Model view
+            :param query:
+                Filtered and searched QuerySet, not sorted nor paginated
+            :param search:
+                Search criteria
+            :param filters:
+                List of applied filters
+        """
+        raise NotImplementedError()
+
+
+class ExactCount(BaseCountStrategy):
+    """
+        Run `COUNT(*)` for every request.
+    """
+
+    def count(self, view, query, search, filters):
+        return query.count()
+
+
+class CachedCount(BaseCountStrategy):
+    """
+        Exact count cached per view and search/filter state.
+
+        Entries expire after `ttl` seconds and are dropped as soon as an
+        instance of the counted model is saved or deleted. Queryset
+        `update()`, `bulk_create()` and raw SQL do not send signals, so
+        the TTL bounds staleness for those.
+    """
+
+    def __init__(self, ttl=60, max_entries=1000):
+        """
+            Constructor.
+
+            :param ttl:
+                Number of seconds a count is reused
+            :param max_entries:
+                Maximum number of counts kept per model
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, model):
+        uid = 'flask_admin_django.counts.%s.%s' % (id(self),
+                                                   model._meta.label_lower)
+
+        post_save.connect(self.invalidate, sender=model, weak=False,
+                          dispatch_uid=uid)
+        post_delete.connect(self.invalidate, sender=model, weak=False,
+                            dispatch_uid=uid)
+
+    def invalidate(self, sender, **kwargs):
+        """
+            Drop cached counts of the `sender` model.
+        """
+        with self._lock:
+            entries = self._entries.get(sender)
+
+            if entries is not None:
+                entries.clear()
+
+    def count(self, view, query, search, filters):
+        model = query.model
+        key = (view.endpoint, get_list_state(None, False, search, filters,
+                                             None))
+        now = time.time()
+
+        with self._lock:
+            entries = self._entries.get(model)
+
+            if entries is None:
+                entries = self._entries[model] = OrderedDict()
+                self._connect(model)
+
+            cached = entries.get(key)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+
+        count = query.count()
+
+        with self._lock:
+            entries[key] = (now + self.ttl, count)
+            entries.move_to_end(key)
+
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+        return count
+
+
+class EstimatedCount(BaseCountStrategy):
+    """
+        Use planner statistics instead of `COUNT(*)` where the database
+        can provide them cheaply:
+
+        * PostgreSQL: `pg_class.reltuples` for unfiltered queries and the
+          `EXPLAIN` row estimate for filtered ones
+        * SQLite: `sqlite_stat1` for unfiltered queries (requires `ANALYZE`)
+
+        Everything else, and estimates below `exact_threshold`, falls back
+        to an exact count. Estimates are returned as
+        :class:`ApproximateCount`.
+    """
+
+    def __init__(self, exact_threshold=10000):
+        """
+            Constructor.
+
+            :param exact_threshold:
+                Run an exact count when the estimate is below this number
+        """
+        self.exact_threshold = exact_threshold
+
+    def _is_unfiltered(self, query):
+        return not query.query.where and not query.query.distinct
+
+    def _estimate_postgresql(self, query, cursor, connection):
+        if self._is_unfiltered(query):
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [connection.ops.quote_name(query.model._meta.db_table)])
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+        sql, params = query.query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def _estimate_sqlite(self, query, cursor, connection):
+        if not self._is_unfiltered(query):
+            return None
+
+        cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s',
+                       [query.model._meta.db_table])
+        row = cursor.fetchone()
+        return int(row[0].split()[0]) if row else None
+
+    def estimate(self, query):
+        """
+            Return planner estimate for the query or None if not available.
+        """
+        connection = connections[query.db]
+        estimator = getattr(self, '_estimate_%s' % connection.vendor, None)
+
+        if estimator is None:
+            return None
+
+        try:
+            with connection.cursor() as cursor:
+                return estimator(query, cursor, connection)
+        except (DatabaseError, LookupError, ValueError, TypeError):
+            return None
+
+    def count(self, view, query, search, filters):
+        estimate = self.estimate(query)
+
+        if estimate is None or estimate < self.exact_threshold:
+            return query.count()
+
+        return ApproximateCount(estimate)
+
+
+def get_count_strategy(strategy):
+    """
+        Resolve `DjangoModelView.count_strategy` into a strategy instance.
+    """
+    if strategy is None or strategy == 'exact':
+        return ExactCount()
+
+    if strategy == 'cached':
+        return CachedCount()
+
+    if strategy == 'estimate':
+        return EstimatedCount()
+
+    if isinstance(strategy, BaseCountStrategy):
+        return strategy
+
+    raise ValueError('Unknown count strategy: %r' % (strategy, ))
+
+
+COUNT_POOL_SIZE = 8
+"""
+    Number of threads of the shared count pool.
+"""
+
+_count_executor = None
+_count_executor_lock = threading.Lock()
+
+
+def get_count_executor(executor):
+    """
+        Resolve `DjangoModelView.concurrent_count` into an executor. True
+        stands for a pool of :data:`COUNT_POOL_SIZE` threads shared by all
+        views, created on first use.
+    """
+    global _count_executor
+
+    if executor is None or executor is False:
+        return None
+
+    if executor is True:
+        with _count_executor_lock:
+            if _count_executor is None:
+                _count_executor = ThreadPoolExecutor(
+                    max_workers=COUNT_POOL_SIZE,
+                    thread_name_prefix='flask-admin-count')
+
+            return _count_executor
+
+    if isinstance(executor, Executor):
+        return executor
+
+    raise ValueError('Unknown count executor: %r' % (executor, ))
+
+
+def _run_with_connection(func, args, recording):
+    # Worker threads get their own Django connections. Close them when
+    # broken or past CONN_MAX_AGE, as Django does at the end of a request.
+    close_old_connections()
+
+    try:
+        if recording is None:
+            return func(*args)
+
+        with record_into(*recording):
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+def submit_count(executor, func, *args):
+    """
+        Run `func(*args)` on the executor, within a copy of the current
+        request context, and return the future. Statements it runs are
+        added to the query statistics recorded by the calling thread, if
+        any.
+    """
+    if has_request_context():
+        func = copy_current_request_context(func)
+
+    return executor.submit(_run_with_connection, func, args,
+                           get_recording())
@@ -1,11 +1,30 @@
+import inspect
+import threading
+import time
+
+from flask import has_request_context
 from flask_admin.babel import lazy_gettext
 from flask_admin.model import filters
 from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
 
 
 class BaseDjangoFilter(filters.BaseFilter):
     """
         Base Django filter.
+
+        Filters build a `Q` object with :meth:`get_q`, so that the view can
+        combine all applied filters into a single `filter()` call.
+    """
+
+    lookup = None
+    """
+        Django lookup appended to the column path, like `icontains`.
+    """
+
+    negate = False
+    """
+        Negate the lookup.
     """
 
     def __init__(self, column, name, options=None, data_type=None):
@@ -13,7 +32,7 @@ class BaseDjangoFilter(filters.BaseFilter):
             Constructor.
 
             :param column:
-                Model field
+                Model field lookup path, like `title` or `author__name`
             :param name:
                 Display name
             :param options:
@@ -24,69 +43,79 @@ class BaseDjangoFilter(filters.BaseFilter):
         super(BaseDjangoFilter, self).__init__(name, options, data_type)
 
         self.column = column
+        self.lookup_path = ('%s__%s' % (column, self.lookup)
+                            if self.lookup else column)
+
+    def get_q(self, value):
+        """
+            Return `Q` object matching the cleaned filter value.
+        """
+        q = Q(**{self.lookup_path: value})
+        return ~q if self.negate else q
+
+    def apply(self, query, value):
+        return query.filter(self.get_q(value))
 
 
 # Common filters
 class FilterEqual(BaseDjangoFilter):
-    def apply(self, query, value):
-        return query.filter(**{"{}__iexact".format(self.column): value})
+    lookup = 'iexact'
 
     def operation(self):
         return lazy_gettext('equals')
 
 
 class FilterNotEqual(BaseDjangoFilter):
-    def apply(self, query, value):
-        return query.filter(~Q(**{"{}__iexact".format(self.column): value}))
+    lookup = 'iexact'
+    negate = True
 
     def operation(self):
         return lazy_gettext('not equal')
 
 
 class FilterLike(BaseDjangoFilter):
-    def apply(self, query, value):
-        return query.filter(**{"{}__icontains".format(self.column): value})
+    lookup = 'icontains'
 
     def operation(self):
         return lazy_gettext('contains')
 
 
 class FilterNotLike(BaseDjangoFilter):
-    def apply(self, query, value):
-        return query.filter(Q(**{"{}__icontains".format(self.column): value}))
-        
+    lookup = 'icontains'
+    negate = True
+
     def operation(self):
         return lazy_gettext('not contains')
 
 
 class FilterGreater(BaseDjangoFilter):
-    def apply(self, query, value):
-        return query.filter(**{"{}__gt".format(self.column): value})
+    lookup = 'gt'
 
     def operation(self):
         return lazy_gettext('greater than')
 
 
 class FilterSmaller(BaseDjangoFilter):
-    def apply(self, query, value):
-        return query.filter(**{"{}__lt".format(self.column): value})
+    lookup = 'lt'
 
     def operation(self):
         return lazy_gettext('smaller than')
 
 
 class FilterEmpty(BaseDjangoFilter, filters.BaseBooleanFilter):
-    def apply(self, query, value):
-        if value == '1':
-            return query.filter(**{"{}__isnull".format(self.column):True})
-        else:
-            return query.filter(~Q(**{"{}__isnull".format(self.column):True}))
+    lookup = 'isnull'
+
+    def get_q(self, value):
+        q = Q(**{self.lookup_path: True})
+        return q if value == '1' else ~q
 
     def operation(self):
         return lazy_gettext('empty')
 
 
 class FilterInList(BaseDjangoFilter):
+    lookup = 'in'
+
     def __init__(self, column, name, options=None, data_type=None):
         super(FilterInList, self).__init__(
             column, name, options, data_type='select2-tags')
@@ -94,19 +123,18 @@ class FilterInList(BaseDjangoFilter):
     def clean(self, value):
         return [v.strip() for v in value.split(',') if v.strip()]
 
-    def apply(self, query, value):
-        return query.filter(**{"{}__in".format(self.column): (value or [None])})
+    def get_q(self, value):
+        q = Q(**{self.lookup_path: value or [None]})
+        return ~q if self.negate else q
 
     def operation(self):
         return lazy_gettext('in list')
 
 
 class FilterNotInList(FilterInList):
-    def apply(self, query, value):
-        # NOT IN can exclude NULL values, so "or_ == None" needed to be added
-        first = ~Q(**{"{}__in".format(self.column): (value or [None])})
-        second = Q(**{"{}__in".format(self.column): (value or [None])})
-        return query.filter(first | second)
+    # Django adds "OR column IS NULL" to negated lookups on nullable
+    # columns, so rows with NULL values are kept
+    negate = True
 
     def operation(self):
         return lazy_gettext('not in list')
@@ -114,21 +142,25 @@ class FilterNotInList(FilterInList):
 
 # Customized type filters
 class BooleanEqualFilter(FilterEqual, filters.BaseBooleanFilter):
+    lookup = 'exact'
+
     def clean(self, value):
         return int(value)
 
 
 class BooleanNotEqualFilter(FilterNotEqual, filters.BaseBooleanFilter):
+    lookup = 'exact'
+
     def clean(self, value):
         return int(value)
 
 
 class IntEqualFilter(FilterEqual, filters.BaseIntFilter):
-    pass
+    lookup = 'exact'
 
 
 class IntNotEqualFilter(FilterNotEqual, filters.BaseIntFilter):
-    pass
+    lookup = 'exact'
 
 
 class IntGreaterFilter(FilterGreater, filters.BaseIntFilter):
@@ -148,11 +180,11 @@ class IntNotInListFilter(filters.BaseIntListFilter, FilterNotInList):
 
 
 class FloatEqualFilter(FilterEqual, filters.BaseFloatFilter):
-    pass
+    lookup = 'exact'
 
 
 class FloatNotEqualFilter(FilterNotEqual, filters.BaseFloatFilter):
-    pass
+    lookup = 'exact'
 
 
 class FloatGreaterFilter(FilterGreater, filters.BaseFloatFilter):
@@ -172,11 +204,11 @@ class FloatNotInListFilter(filters.BaseFloatListFilter, FilterNotInList):
 
 
 class DateEqualFilter(FilterEqual, filters.BaseDateFilter):
-    pass
+    lookup = 'exact'
 
 
 class DateNotEqualFilter(FilterNotEqual, filters.BaseDateFilter):
-    pass
+    lookup = 'exact'
 
 
 class DateGreaterFilter(FilterGreater, filters.BaseDateFilter):
@@ -188,30 +220,26 @@ class DateSmallerFilter(FilterSmaller, filters.BaseDateFilter):
 
 
 class DateBetweenFilter(BaseDjangoFilter, filters.BaseDateBetweenFilter):
+    lookup = 'range'
+
     def __init__(self, column, name, options=None, data_type=None):
         super(DateBetweenFilter, self).__init__(
             column, name, options, data_type='daterangepicker')
 
-    def apply(self, query, value):
-        start, end = value
-        return query.filter(**{"{}__range".format(self.column):(start, end)})
-
 
 class DateNotBetweenFilter(DateBetweenFilter):
-    def apply(self, query, value):
-        start, end = value
-        return query.filter(~Q(**{"{}__range".format(self.column):(start, end)}))
+    negate = True
 
     def operation(self):
         return lazy_gettext('not between')
 
 
 class DateTimeEqualFilter(FilterEqual, filters.BaseDateTimeFilter):
-    pass
+    lookup = 'exact'
 
 
 class DateTimeNotEqualFilter(FilterNotEqual, filters.BaseDateTimeFilter):
-    pass
+    lookup = 'exact'
 
 
 class DateTimeGreaterFilter(FilterGreater, filters.BaseDateTimeFilter):
@@ -224,30 +252,26 @@ class DateTimeSmallerFilter(FilterSmaller, filters.BaseDateTimeFilter):
 
 class DateTimeBetweenFilter(BaseDjangoFilter,
                             filters.BaseDateTimeBetweenFilter):
+    lookup = 'range'
+
     def __init__(self, column, name, options=None, data_type=None):
         super(DateTimeBetweenFilter, self).__init__(
             column, name, options, data_type='datetimerangepicker')
 
-    def apply(self, query, value):
-        start, end = value
-        return query.filter(Q(**{"{}__range".format(self.column):(start, end)}))
-
 
 class DateTimeNotBetweenFilter(DateTimeBetweenFilter):
-    def apply(self, query, value):
-        start, end = value
-        return query.filter(~Q(**{"{}__range".format(self.column):(start, end)}))
+    negate = True
 
     def operation(self):
         return lazy_gettext('not between')
 
 
 class TimeEqualFilter(FilterEqual, filters.BaseTimeFilter):
-    pass
+    lookup = 'exact'
 
 
 class TimeNotEqualFilter(FilterNotEqual, filters.BaseTimeFilter):
-    pass
+    lookup = 'exact'
 
 
 class TimeGreaterFilter(FilterGreater, filters.BaseTimeFilter):
@@ -259,25 +283,147 @@ class TimeSmallerFilter(FilterSmaller, filters.BaseTimeFilter):
 
 
 class TimeBetweenFilter(BaseDjangoFilter, filters.BaseTimeBetweenFilter):
+    lookup = 'range'
+
     def __init__(self, column, name, options=None, data_type=None):
         super(TimeBetweenFilter, self).__init__(
             column, name, options, data_type='timerangepicker')
 
-    def apply(self, query, value):
-        start, end = value
-        return query.filter(Q(**{"{}__range".format(self.column):(start, end)}))
-
 
 class TimeNotBetweenFilter(TimeBetweenFilter):
-    def apply(self, query, value):
-        start, end = value
-        return query.filter(~Q(**{"{}__range".format(self.column):(start, end)}))
+    negate = True
 
     def operation(self):
         return lazy_gettext('not between')
 
 
-# Base peewee filter field converter
+# Option filters, matching stored values exactly
+class FilterOptionEqual(FilterEqual):
+    lookup = 'exact'
+
+
+class FilterOptionNotEqual(FilterNotEqual):
+    lookup = 'exact'
+
+
+class FilterOptionInList(FilterInList):
+    def __init__(self, column, name, options=None, data_type=None):
+        # Skip the select2-tags data type, options render as a select
+        super(FilterInList, self).__init__(column, name, options, data_type)
+
+
+class FilterOptionNotInList(FilterOptionInList):
+    negate = True
+
+    def operation(self):
+        return lazy_gettext('not in list')
+
+
+class DistinctOptions(object):
+    """
+        Filter options loaded with `SELECT DISTINCT` from the database.
+
+        Values are cached for `ttl` seconds and reloaded after an instance
+        of the model, or of the model holding the column, is saved or
+        deleted. Columns with more than `max_options` distinct values get
+        no options, so the filter falls back to a text input.
+
+        Options are only loaded while handling a request, never at
+        scaffolding time.
+    """
+
+    def __init__(self, model, column, max_options=50, ttl=300):
+        """
+            Constructor.
+
+            :param model:
+                Model of the view
+            :param column:
+                Field lookup path
+            :param max_options:
+                Maximum number of options
+            :param ttl:
+                Number of seconds options are reused
+        """
+        self.model = model
+        self.column = column
+        self.max_options = max_options
+        self.ttl = ttl
+
+        self._options = None
+        self._expires = 0
+        self._lock = threading.Lock()
+        self._connected = False
+
+    def _connect(self):
+        from .tools import get_lookup_field
+
+        models = set([self.model])
+
+        resolved = get_lookup_field(self.model, self.column)
+        if resolved is not None:
+            models.add(resolved[0].model)
+
+        for model in models:
+            uid = 'flask_admin_django.filters.%s.%s' % (
+                id(self), model._meta.label_lower)
+
+            post_save.connect(self.invalidate, sender=model, weak=False,
+                              dispatch_uid=uid)
+            post_delete.connect(self.invalidate, sender=model, weak=False,
+                                dispatch_uid=uid)
+
+    def invalidate(self, sender=None, **kwargs):
+        """
+            Reload options on next use.
+        """
+        self._expires = 0
+
+    def get_query(self):
+        return (self.model._default_manager
+                .exclude(**{'%s__isnull' % self.column: True})
+                .exclude(**{self.column: ''})
+                .order_by(self.column)
+                .values_list(self.column, flat=True)
+                .distinct())
+
+    def __call__(self):
+        if not has_request_context():
+            return None
+
+        with self._lock:
+            if not self._connected:
+                self._connect()
+                self._connected = True
+
+            if self._expires > time.time():
+                return self._options
+
+        values = list(self.get_query()[:self.max_options + 1])
+
+        if len(values) > self.max_options:
+            options = None
+        else:
+            options = [(value, value) for value in values]
+
+        with self._lock:
+            self._options = options
+            self._expires = time.time() + self.ttl
+
+        return options
+
+
+def _accepts_model(func):
+    try:
+        params = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return False
+
+    return any(param.name == 'model' or param.kind == param.VAR_KEYWORD
+               for param in params)
+
+
+# Base Django filter field converter
 class FilterConverter(filters.BaseFilterConverter):
     strings = (FilterLike, FilterNotLike, FilterEqual, FilterNotEqual,
                FilterEmpty, FilterInList, FilterNotInList)
@@ -298,39 +444,103 @@ class FilterConverter(filters.BaseFilterConverter):
     time_filters = (TimeEqualFilter, TimeNotEqualFilter, TimeGreaterFilter,
                     TimeSmallerFilter, TimeBetweenFilter, TimeNotBetweenFilter,
                     FilterEmpty)
+    option_filters = (FilterOptionEqual, FilterOptionNotEqual, FilterEmpty,
+                      FilterOptionInList, FilterOptionNotInList)
+
+    def __init__(self, distinct_options=False, max_options=50,
+                 options_ttl=300):
+        """
+            Constructor.
+
+            :param distinct_options:
+                Offer the distinct values of string columns as filter
+                options, see :class:`DistinctOptions`. Either True for all
+                string columns or a list of lookup paths, like
+                `['status', 'author__country']`
+            :param max_options:
+                Columns with more distinct values keep a text input
+            :param options_ttl:
+                Number of seconds distinct values are cached
+        """
+        super(FilterConverter, self).__init__()
+
+        self.distinct_options = distinct_options
+        self.max_options = max_options
+        self.options_ttl = options_ttl
+
+    def convert(self, type_name, column, name, field=None, model=None):
+        """
+            Return filters for a column.
+
+            :param type_name:
+                Internal type of the model field
+            :param column:
+                Field lookup path
+            :param name:
+                Display name
+            :param field:
+                Model field, enables options of fields with `choices`
+            :param model:
+                Model of the view, enables distinct value options
+        """
+        if field is not None and field.choices:
+            return self.conv_choices(column, name, field.flatchoices)
 
-    def convert(self, type_name, column, name):
         filter_name = type_name.lower()
 
         if filter_name in self.converters:
-            return self.converters[filter_name](column, name)
+            converter = self.converters[filter_name]
+
+            # Converters of subclasses may predate the model argument
+            if _accepts_model(converter):
+                return converter(column, name, model=model)
+
+            return converter(column, name)
 
         return None
 
+    def conv_choices(self, column, name, choices):
+        options = [(value, label) for value, label in choices]
+        return [f(column, name, options=options) for f in self.option_filters]
+
+    def _use_distinct_options(self, column):
+        if self.distinct_options is True:
+            return True
+
+        return column in (self.distinct_options or ())
+
     @filters.convert('CharField', 'TextField')
-    def conv_string(self, column, name):
+    def conv_string(self, column, name, model=None, **kwargs):
+        if model is not None and self._use_distinct_options(column):
+            options = DistinctOptions(model, column, self.max_options,
+                                      self.options_ttl)
+            return [f(column, name, options=options)
+                    for f in self.option_filters]
+
         return [f(column, name) for f in self.strings]
 
     @filters.convert('BooleanField')
-    def conv_bool(self, column, name):
+    def conv_bool(self, column, name, **kwargs):
         return [f(column, name) for f in self.bool_filters]
 
-    @filters.convert('IntegerField', 'BigIntegerField', 'AutoField')
-    def conv_int(self, column, name):
+    @filters.convert('IntegerField', 'BigIntegerField', 'SmallIntegerField',
+                     'PositiveIntegerField', 'PositiveSmallIntegerField',
+                     'AutoField', 'BigAutoField')
+    def conv_int(self, column, name, **kwargs):
         return [f(column, name) for f in self.int_filters]
 
     @filters.convert('DecimalField', 'FloatField', 'DoubleField')
-    def conv_float(self, column, name):
+    def conv_float(self, column, name, **kwargs):
         return [f(column, name) for f in self.float_filters]
 
     @filters.convert('DateField')
-    def conv_date(self, column, name):
+    def conv_date(self, column, name, **kwargs):
         return [f(column, name) for f in self.date_filters]
 
     @filters.convert('DateTimeField')
-    def conv_datetime(self, column, name):
+    def conv_datetime(self, column, name, **kwargs):
         return [f(column, name) for f in self.datetime_filters]
 
     @filters.convert('TimeField')
-    def conv_time(self, column, name):
+    def conv_time(self, column, name, **kwargs):
         return [f(column, name) for f in self.time_filters]
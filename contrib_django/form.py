@@ -1,18 +1,22 @@
 from wtforms import fields
 
+from django.db import connections, router, transaction
+from django.db.models.signals import post_save
 from django.db.models import Model as BaseModel
 from django.db.models.fields import AutoField
 from wtforms.ext.django.orm import ModelConverter, model_form
+from wtforms.utils import unset_value
 
 from flask_admin import form
-from flask_admin._compat import iteritems, itervalues
+from flask_admin._compat import iteritems, itervalues, as_unicode
 from flask_admin.model.form import InlineFormAdmin, InlineModelConverterBase
-from flask_admin.model.fields import InlineModelFormField, InlineFieldList, AjaxSelectField
+from flask_admin.model.fields import (InlineModelFormField, InlineFieldList,
+                                     AjaxSelectField, AjaxSelectMultipleField)
 from flask_admin.model.form import (converts, ModelConverterBase,
                                     InlineModelConverterBase, FieldPlaceholder)
 
 from .tools import get_primary_key, get_meta_fields
-from .ajax import create_ajax_loader
+from .ajax import create_ajax_loader, prefetch_ajax_relations
 
 from wtforms import fields, validators
 
@@ -39,61 +43,142 @@ class InlineModelFormList(InlineFieldList):
     def display_row_controls(self, field):
         return field.get_pk() is not None
 
-    """ bryhoyt removed def process() entirely, because I believe it was buggy
-        (but worked because another part of the code had a complimentary bug)
-        and I'm not sure why it was necessary anyway.
+    def process(self, formdata, data=unset_value):
+        # Related managers are not iterable, load the related objects
+        if hasattr(data, 'all'):
+            data = list(data.all())
 
-        If we want it back in, we need to fix the following bogus query:
-        self.model.select().where(attr == data).execute()
+        # Load AJAX foreign keys of all rows at once, instead of one query
+        # per row when the entries read them
+        if data and data is not unset_value:
+            prefetch_ajax_relations(
+                getattr(self.inline_view, '_form_ajax_refs', None) or {},
+                list(data))
 
-        `data` is not an ID, and only happened to be so because we patched it
-        in in .contribute() below
-
-        For reference, .process() introduced in:
-        https://github.com/flask-admin/flask-admin/commit/2845e4b28cb40b25e2bf544b327f6202dc7e5709
-
-        Fixed, brokenly I think, in:
-        https://github.com/flask-admin/flask-admin/commit/4383eef3ce7eb01878f086928f8773adb9de79f8#diff-f87e7cd76fb9bc48c8681b24f238fb13R30
-    """
+        return super(InlineModelFormList, self).process(formdata, data)
 
     def populate_obj(self, obj, name):
         pass
 
+    def _has_nested_inlines(self):
+        return any(f.type == 'InlineModelFormList'
+                   for f in self.form())
+
+    def _get_values(self, model):
+        return dict((field.attname, field.value_from_object(model))
+                    for field in model._meta.concrete_fields)
+
+    def _touch(self, model):
+        # bulk_update() does not call pre_save(), set auto_now fields
+        names = []
+
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False):
+                field.pre_save(model, False)
+                names.append(field.name)
+
+        return names
+
     def save_related(self, obj):
-        model_id = getattr(obj, self._pk)
+        """
+            Save inline models of `obj`.
+
+            Existing inline models are loaded with one query, then new ones
+            are inserted with `bulk_create`, changed ones written with one
+            `bulk_update` of the changed columns and removed ones deleted
+            with a single `pk__in` query, all in one transaction.
+
+            `save()` is not called and `pre_save` is not sent, but
+            `auto_now` fields of changed models are set and `post_save` is
+            sent for every created and changed model, so that caches and
+            search indexes kept in sync by signals see inline changes.
+
+            :param obj:
+                Parent model instance
+        """
+        manager = self.model._default_manager
+        using = router.db_for_write(self.model, instance=obj)
+
+        with transaction.atomic(using=using):
+            existing = dict(
+                (as_unicode(model.pk), model)
+                for model in manager.using(using).filter(**{self.prop: obj}))
+
+            created = []
+            changed = []
+            changed_fields = set()
+            deleted = []
+            saved = []
+
+            # Handle request data
+            for field in self.entries:
+                field_id = as_unicode(field.get_pk() or '')
+
+                is_created = field_id not in existing
+                if not is_created:
+                    model = existing[field_id]
+
+                    if self.should_delete(field):
+                        deleted.append(model.pk)
+                        continue
+
+                    before = self._get_values(model)
+                else:
+                    model = self.model()
+
+                field.populate_obj(model, None)
 
-        attr = getattr(self.model, self.prop)
-        values = self.model.select().where(attr == model_id).execute()
+                # Force relation
+                setattr(model, self.prop, obj)
 
-        pk_map = dict((str(getattr(v, self._pk)), v) for v in values)
+                self.inline_view._on_model_change(field, model, is_created)
 
-        # Handle request data
-        for field in self.entries:
-            field_id = field.get_pk()
+                if is_created:
+                    created.append(model)
+                else:
+                    after = self._get_values(model)
+                    names = [f.name for f in model._meta.concrete_fields
+                             if before[f.attname] != after[f.attname]]
 
-            is_created = field_id not in pk_map
-            if not is_created:
-                model = pk_map[field_id]
+                    if names:
+                        changed.append(model)
+                        changed_fields.update(names)
+                        changed_fields.update(self._touch(model))
 
-                if self.should_delete(field):
-                    model.delete_instance(recursive=True)
-                    continue
-            else:
-                model = self.model()
+                saved.append((field, model))
+
+            if deleted:
+                manager.using(using).filter(pk__in=deleted).delete()
 
-            field.populate_obj(model, None)
+            signalled = []
 
-            # Force relation
-            setattr(model, self.prop, model_id)
+            if created:
+                features = connections[using].features
+
+                if (self._has_nested_inlines() and
+                        not features.can_return_rows_from_bulk_insert):
+                    # Nested inlines need primary keys of the new models
+                    for model in created:
+                        model.save(using=using)
+                else:
+                    manager.using(using).bulk_create(created)
+                    signalled.extend((model, True) for model in created)
 
-            self.inline_view._on_model_change(field, model, is_created)
+            if changed:
+                manager.using(using).bulk_update(changed,
+                                                 sorted(changed_fields))
+                signalled.extend((model, False) for model in changed)
 
-            model.save()
+            for model, is_created in signalled:
+                post_save.send(sender=self.model, instance=model,
+                               created=is_created, update_fields=None,
+                               raw=False, using=using)
 
             # Recurse, to save multi-level nested inlines
-            for f in itervalues(field.form._fields):
-                if f.type == 'InlineModelFormList':
-                    f.save_related(model)
+            for field, model in saved:
+                for f in itervalues(field.form._fields):
+                    if f.type == 'InlineModelFormList':
+                        f.save_related(model)
 
 
 class CustomModelConverter(ModelConverterBase):
@@ -128,7 +213,7 @@ class CustomModelConverter(ModelConverterBase):
             'description': getattr(field, 'help_text', ''),
             'validators': [],
             'filters': [],
-            'default': field.default
+            'default': field.default if field.has_default() else None
         }
 
         if field_args:
@@ -162,9 +247,64 @@ class CustomModelConverter(ModelConverterBase):
         if override:
             return override(**kwargs)
 
+        ajax_refs = getattr(self.view, '_form_ajax_refs', None)
+        loader = ajax_refs.get(field.name) if ajax_refs else None
+        if loader is not None:
+            if field.many_to_many:
+                return AjaxSelectMultipleField(loader, **kwargs)
+
+            kwargs['allow_blank'] = field.null
+            return AjaxSelectField(loader, **kwargs)
+
         if ftype in self.converters:
             return self.converters[ftype](model, field, kwargs)
 
+        return self.convert_column(model, field, kwargs)
+
+    def convert_column(self, model, field, kwargs):
+        """
+            Convert a model field no other rule applies to. Such fields are
+            left out of the form.
+        """
+        return None
+
+
+class ColumnModelConverter(CustomModelConverter):
+    """
+        Converter also converting plain editable columns, which
+        :class:`CustomModelConverter` leaves out, with the wtforms Django
+        converters. Used by the "Set fields" action form; set it as
+        `model_form_converter` to edit plain columns in the create, edit
+        and inline forms as well::
+
+            class PostView(DjangoModelView):
+                model_form_converter = ColumnModelConverter
+    """
+
+    def convert_column(self, model, field, kwargs):
+        # Relations are only editable through `form_ajax_refs`
+        if field.is_relation or not field.editable or isinstance(
+                field, AutoField):
+            return None
+
+        ftype = type(field).__name__
+        converter = (self.converter_class.converters.get(ftype) or
+                     getattr(self.converter_class, 'conv_%s' % ftype, None))
+
+        if converter is None:
+            return None
+
+        if field.blank:
+            kwargs['validators'].append(validators.Optional())
+        elif ftype not in ('BooleanField', 'NullBooleanField'):
+            kwargs['validators'].append(validators.InputRequired())
+
+        if field.max_length:
+            kwargs['validators'].append(
+                validators.Length(max=field.max_length))
+
+        return converter(model, field, kwargs)
+
 
 def get_form(model,
              converter,
@@ -176,6 +316,19 @@ def get_form(model,
     """
         Create form from django model and contribute extra fields, if necessary
     """
+    # wtforms names fields after `attname`, accept relation names as well
+    attnames = dict((f.name, f.attname) for f in model._meta.fields)
+
+    if only:
+        only = [attnames.get(name, name) for name in only]
+
+    if exclude:
+        exclude = [attnames.get(name, name) for name in exclude]
+
+    if field_args:
+        field_args = dict((attnames.get(name, name), args)
+                          for name, args in iteritems(field_args))
+
     result = model_form(
         model,
         base_class=base_class,
@@ -184,6 +337,15 @@ def get_form(model,
         field_args=field_args,
         converter=converter)
 
+    # AJAX fields hold model instances, so bind them to the relation name
+    for name, attname in iteritems(attnames):
+        unbound = getattr(result, attname, None)
+
+        if (name != attname and unbound is not None and
+                issubclass(unbound.field_class, AjaxSelectField)):
+            delattr(result, attname)
+            setattr(result, name, unbound)
+
     if extra_fields:
         for name, field in iteritems(extra_fields):
             setattr(result, name, form.recreate_field(field))
@@ -208,7 +370,7 @@ class InlineModelConverter(InlineModelConverterBase):
         info = super(InlineModelConverter, self).get_info(p)
 
         if info is None:
-            if isinstance(p, BaseModel):
+            if isinstance(p, type) and issubclass(p, BaseModel):
                 info = InlineFormAdmin(p)
             else:
                 model = getattr(p, 'model', None)
@@ -238,9 +400,10 @@ class InlineModelConverter(InlineModelConverterBase):
                 new_name = '%s.%s' % (info.model.__name__.lower(), name)
 
                 loader = None
-                if isinstance(opts, (list, tuple)):
-                    loader = create_ajax_loader(info.model, new_name, name,
-                                                opts)
+                if isinstance(opts, dict):
+                    loader = create_ajax_loader(
+                        info.model, new_name, name,
+                        self.view.get_ajax_loader_options(opts))
                 else:
                     loader = opts
 
@@ -256,12 +419,10 @@ class InlineModelConverter(InlineModelConverterBase):
         info = self.get_info(inline_model)
 
         for field in get_meta_fields(info.model):
-            field_type = type(field)
-
-            if field_type == AutoField:
-                if field.rel_model == model:
-                    reverse_field = field
-                    break
+            if (field.concrete and (field.many_to_one or field.one_to_one)
+                    and field.related_model == model):
+                reverse_field = field
+                break
         else:
             raise Exception('Cannot find reverse relation for model %s' %
                             info.model)
@@ -270,7 +431,7 @@ class InlineModelConverter(InlineModelConverterBase):
         ignore = [reverse_field.name]
 
         if info.form_excluded_columns:
-            exclude = ignore + info.form_excluded_columns
+            exclude = ignore + list(info.form_excluded_columns)
         else:
             exclude = ignore
 
@@ -278,15 +439,21 @@ class InlineModelConverter(InlineModelConverterBase):
         child_form = info.get_form()
 
         if child_form is None:
-            child_form = model_form(
+            # Inline AJAX references are resolved by the inline info
+            child_form = get_form(
                 info.model,
+                type(converter)(info),
                 base_class=form.BaseForm,
                 only=info.form_columns,
                 exclude=exclude,
                 field_args=info.form_args,
-                converter=converter)
+                extra_fields=info.form_extra_fields)
+
+        pk = get_primary_key(info.model)
+        if not hasattr(child_form, pk):
+            setattr(child_form, pk, fields.HiddenField())
 
-        prop_name = reverse_field.related_name
+        prop_name = reverse_field.remote_field.get_accessor_name()
 
         label = self.get_label(info, prop_name)
 
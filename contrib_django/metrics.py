@@ -0,0 +1,276 @@
+import heapq
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response
+from django.db import connections
+
+log = logging.getLogger("flask-admin.django")
+
+# Recordings active in the current thread, innermost last
+_recording = threading.local()
+
+
+class QueryStats(object):
+    """
+        SQL statistics of one request.
+    """
+
+    def __init__(self, endpoint, max_slowest=5):
+        """
+            Constructor.
+
+            :param endpoint:
+                Name of the view endpoint, like `post.index_view`
+            :param max_slowest:
+                Number of slowest statements kept
+        """
+        self.endpoint = endpoint
+        self.max_slowest = max_slowest
+
+        self.queries = 0
+        self.time = 0.0
+        self.rows = 0
+        self.slowest = []
+
+        # Statements of a request can run in worker threads too
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Django execute_wrapper
+        started = time.time()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.time() - started
+            rowcount = getattr(context.get('cursor'), 'rowcount', -1)
+
+            with self._lock:
+                self.queries += 1
+                self.time += duration
+
+                if rowcount and rowcount > 0:
+                    self.rows += rowcount
+
+                item = (duration, self.queries, sql[:1000])
+
+                if len(self.slowest) < self.max_slowest:
+                    heapq.heappush(self.slowest, item)
+                else:
+                    heapq.heappushpop(self.slowest, item)
+
+    def get_slowest(self):
+        """
+            Return list of `(seconds, sql)` tuples, slowest first.
+        """
+        return [(duration, sql) for duration, _, sql in
+                sorted(self.slowest, reverse=True)]
+
+
+def get_recording():
+    """
+        Return `(stats, using)` of the innermost recording active in the
+        current thread, or None.
+    """
+    stack = getattr(_recording, 'stack', None)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def record_into(stats, using=None):
+    """
+        Record statements executed by the current thread on the given
+        database aliases, or on all of them, within the block into
+        existing statistics. Use it to add statements of worker threads or
+        of a streamed response to the statistics of their request.
+
+        :param stats:
+            :class:`QueryStats` instance
+        :param using:
+            List of database aliases
+    """
+    # Django connections are per thread, so are their execute wrappers
+    wrappers = [connections[alias].execute_wrapper(stats)
+                for alias in (using or connections)]
+
+    for wrapper in wrappers:
+        wrapper.__enter__()
+
+    stack = _recording.__dict__.setdefault('stack', [])
+    stack.append((stats, using))
+
+    try:
+        yield stats
+    finally:
+        stack.pop()
+
+        for wrapper in reversed(wrappers):
+            wrapper.__exit__(None, None, None)
+
+
+@contextmanager
+def record_queries(endpoint, using=None, max_slowest=5):
+    """
+        Record statements executed on the given database aliases, or on all
+        of them, within the block.
+
+        :param endpoint:
+            Name of the view endpoint
+        :param using:
+            List of database aliases
+        :param max_slowest:
+            Number of slowest statements kept
+    """
+    with record_into(QueryStats(endpoint, max_slowest), using) as stats:
+        yield stats
+
+
+class BaseMetricsSink(object):
+    """
+        Base metrics sink.
+    """
+
+    def emit(self, stats):
+        """
+            Publish statistics of a request.
+
+            :param stats:
+                :class:`QueryStats` instance
+        """
+        raise NotImplementedError()
+
+
+class LoggingSink(BaseMetricsSink):
+    """
+        Log statistics of every request.
+    """
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def emit(self, stats):
+        log.log(self.level, '%s: %d queries, %.1f ms, %d rows',
+                stats.endpoint, stats.queries, stats.time * 1000, stats.rows)
+
+
+class StatsdSink(BaseMetricsSink):
+    """
+        Send statistics to a StatsD compatible collector over UDP.
+
+        Emits `<prefix>.<endpoint>.queries` and `.rows` counters and a
+        `.db_time` timer. Sending never blocks nor raises.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='flask_admin'):
+        """
+            Constructor.
+
+            :param host:
+                Collector host
+            :param port:
+                Collector port
+            :param prefix:
+                Metric name prefix
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def emit(self, stats):
+        name = '%s.%s' % (self.prefix, stats.endpoint)
+        payload = '\n'.join([
+            '%s.requests:1|c' % name,
+            '%s.queries:%d|c' % (name, stats.queries),
+            '%s.rows:%d|c' % (name, stats.rows),
+            '%s.db_time:%d|ms' % (name, stats.time * 1000),
+        ])
+
+        try:
+            self._socket.sendto(payload.encode('utf-8'), self.address)
+        except (socket.error, OSError):
+            pass
+
+
+class PrometheusSink(BaseMetricsSink):
+    """
+        Accumulate statistics in-process and render them in the Prometheus
+        text format. Expose :meth:`response` as a Flask view::
+
+            app.add_url_rule('/metrics', 'metrics', prometheus_sink.response)
+
+        Counters are per process, so with several workers scrape each of
+        them or use :class:`StatsdSink` instead.
+    """
+
+    metrics = (
+        ('requests', 'Number of admin requests'),
+        ('queries', 'Number of SQL statements'),
+        ('rows', 'Number of rows returned or affected'),
+        ('db_seconds', 'Time spent in SQL statements'),
+    )
+
+    def __init__(self, prefix='flask_admin_django'):
+        self.prefix = prefix
+
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def emit(self, stats):
+        with self._lock:
+            values = self._values.setdefault(stats.endpoint, [0, 0, 0, 0.0])
+            values[0] += 1
+            values[1] += stats.queries
+            values[2] += stats.rows
+            values[3] += stats.time
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+
+        lines = []
+
+        for idx, (name, help_text) in enumerate(self.metrics):
+            metric = '%s_%s_total' % (self.prefix, name)
+            lines.append('# HELP %s %s' % (metric, help_text))
+            lines.append('# TYPE %s counter' % metric)
+
+            for endpoint, values in items:
+                lines.append('%s{endpoint="%s"} %s' % (
+                    metric, endpoint.replace('"', '\\"'), values[idx]))
+
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(),
+                        mimetype='text/plain; version=0.0.4')
+
+
+prometheus_sink = PrometheusSink()
+
+
+def get_metrics_sink(sink):
+    """
+        Resolve `DjangoModelView.query_metrics` into a sink instance.
+    """
+    if sink is None or sink is False:
+        return None
+
+    if sink == 'logging':
+        return LoggingSink()
+
+    if sink == 'statsd':
+        return StatsdSink()
+
+    if sink == 'prometheus':
+        return prometheus_sink
+
+    if isinstance(sink, BaseMetricsSink):
+        return sink
+
+    raise ValueError('Unknown metrics sink: %r' % (sink, ))
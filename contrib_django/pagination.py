@@ -0,0 +1,136 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+        JSON encoder keeping the microseconds of datetimes and times, which
+        `DjangoJSONEncoder` truncates to milliseconds. The seek predicate
+        compares against these values, so they must round-trip exactly.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+
+        return super(CursorJSONEncoder, self).default(o)
+
+
+def get_list_state(sort_column, sort_desc, search, filters, page_size):
+    """
+        Return a short digest of the list state (sort, search, filters and
+        page size). Cursors are only honoured for the state they were
+        generated for.
+    """
+    flt = [(f[0], f[2]) for f in filters or ()]
+    state = (sort_column, bool(sort_desc), search or None, flt, page_size)
+    return hashlib.md5(repr(state).encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(page, direction, values, state):
+    """
+        Encode keyset cursor into an URL-safe string.
+
+        :param page:
+            Page number the cursor leads to
+        :param direction:
+            `next` to seek after `values`, `prev` to seek before them
+        :param values:
+            Ordering values of the boundary row, parsed back with the
+            field `to_python` when the cursor is used
+        :param state:
+            List state digest, see :func:`get_list_state`
+    """
+    data = json.dumps({'p': page, 'd': direction, 'v': values, 's': state},
+                      cls=CursorJSONEncoder,
+                      separators=(',', ':'))
+    return base64.urlsafe_b64encode(
+        data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+        Decode cursor created by :func:`encode_cursor`. Returns
+        `(page, direction, values, state)` tuple or None if the cursor
+        is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(
+            base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        return int(data['p']), data['d'], list(data['v']), data['s']
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        return None
+
+
+def get_keyset_fields(model, ordering):
+    """
+        Resolve ordering into a list of `(attname, field, desc)` triples
+        with the primary key appended as a tie-breaker.
+
+        Returns None when the ordering can not be served by a seek
+        predicate: related paths and nullable columns are not supported,
+        as NULLs do not compare and their position in ORDER BY is
+        database specific.
+
+        :param model:
+            Django model class
+        :param ordering:
+            List of `(column name, desc)` tuples
+    """
+    result = []
+
+    for name, desc in ordering:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+        if not field.concrete or field.many_to_many or field.null:
+            return None
+
+        result.append((field.attname, field, bool(desc)))
+
+        if field.primary_key:
+            return result
+
+    pk = model._meta.pk
+    result.append((pk.attname, pk, result[-1][2] if result else False))
+
+    return result
+
+
+def get_seek_filter(keys, values, forward=True):
+    """
+        Build the predicate selecting rows that come after (or before, if
+        `forward` is False) the row with the given ordering values.
+
+        :param keys:
+            Ordering, as returned by :func:`get_keyset_fields`
+        :param values:
+            Ordering values of the boundary row
+        :param forward:
+            Seek direction
+    """
+    stmt = None
+    equal = {}
+
+    for (attname, field, desc), value in zip(keys, values):
+        op = 'gt' if desc != forward else 'lt'
+        q = Q(**dict(equal, **{'%s__%s' % (attname, op): value}))
+
+        if stmt is None:
+            stmt = q
+        else:
+            stmt |= q
+
+        equal[attname] = value
+
+    return stmt
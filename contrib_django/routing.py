@@ -0,0 +1,61 @@
+import time
+
+from flask import session, has_request_context
+
+WRITE_SESSION_KEY = '_admin_db_write'
+
+
+def mark_write():
+    """
+        Remember in the user session that it has just written to the
+        primary database, so that its following reads are not served by a
+        lagging replica. Does nothing outside of a request or when the
+        application has no session (no `SECRET_KEY`).
+    """
+    if not has_request_context():
+        return
+
+    try:
+        session[WRITE_SESSION_KEY] = time.time()
+    except RuntimeError:
+        pass
+
+
+def is_pinned_to_primary(window):
+    """
+        Return True if the session has written less than `window` seconds
+        ago.
+
+        :param window:
+            Number of seconds, or None to never pin
+    """
+    if not window or not has_request_context():
+        return False
+
+    written = session.get(WRITE_SESSION_KEY)
+
+    return written is not None and time.time() - written < window
+
+
+def get_read_alias(read_using, model, window=None):
+    """
+        Resolve the database alias for read-only queries of `model`.
+
+        Returns None, meaning the default routing, when no read alias is
+        configured, the router callable returns None or the session is
+        pinned to the primary after a recent write.
+
+        :param read_using:
+            Database alias or callable taking the model and returning one
+        :param model:
+            Django model class
+        :param window:
+            Number of seconds reads stay on the primary after a write
+    """
+    if read_using is None or is_pinned_to_primary(window):
+        return None
+
+    if callable(read_using):
+        return read_using(model)
+
+    return read_using
@@ -0,0 +1,256 @@
+import gc
+import logging
+import threading
+import time
+import tracemalloc
+from functools import wraps
+
+from flask_admin._compat import iteritems, itervalues
+from wtforms.form import FormMeta
+
+log = logging.getLogger("flask-admin.django")
+
+
+class ScaffoldCache(object):
+    """
+        Process-wide cache of scaffolded form classes and filters.
+
+        Entries are keyed by the scaffolding method, the view model, the
+        method arguments and the view options the method depends on, so
+        views of the same model with identical options share one copy.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def get_or_create(self, key, factory):
+        """
+            Return cached value of `key`, calling `factory` to create it.
+        """
+        with self._lock:
+            try:
+                return self._entries[key]
+            except KeyError:
+                value = self._entries[key] = factory()
+                return value
+
+    def clear(self):
+        """
+            Drop all cached values.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+scaffold_cache = ScaffoldCache()
+
+
+def freeze(value):
+    """
+        Convert view option into a hashable value. Dictionaries and
+        sequences are compared by content, anything else by hash, which for
+        most objects (validators, widgets, loaders) means by identity.
+
+        Raises `TypeError` when the value can not be hashed.
+    """
+    if isinstance(value, dict):
+        return (dict, tuple(sorted(
+            ((freeze(k), freeze(v)) for k, v in iteritems(value)),
+            key=repr)))
+
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(freeze(v) for v in value))
+
+    if isinstance(value, (set, frozenset)):
+        return (frozenset, frozenset(freeze(v) for v in value))
+
+    hash(value)
+    return value
+
+
+def copy_form_class(form_class):
+    """
+        Return a copy of a form class with its own fields, so that fields
+        removed from it, as form rules do, stay on the copy.
+    """
+    attrs = dict((name, value) for name, value in iteritems(form_class.__dict__)
+                 if name not in ('__dict__', '__weakref__'))
+
+    return type(form_class)(form_class.__name__, form_class.__bases__, attrs)
+
+
+def cached_scaffold(*options):
+    """
+        Memoize a scaffolding method of a view in :data:`scaffold_cache`,
+        unless the view sets `scaffold_cache` to False.
+
+        Entries are keyed by the view class too, as subclasses may override
+        scaffolding helpers. Form classes are copied on every call, so
+        that views, and the create and edit forms of a view, can modify
+        theirs.
+
+        AJAX loaders registered in the view `_form_ajax_refs` while
+        scaffolding, as inline forms do, are stored with the result and
+        registered in every view sharing it.
+
+        :param options:
+            Names of the view attributes the result depends on
+    """
+    def decorator(func):
+        @wraps(func)
+        def inner(self, *args, **kwargs):
+            if not getattr(self, 'scaffold_cache', False):
+                return func(self, *args, **kwargs)
+
+            try:
+                key = freeze((func.__name__, type(self), self.model, args,
+                              kwargs,
+                              [getattr(self, name, None) for name in options]))
+            except TypeError:
+                return func(self, *args, **kwargs)
+
+            def factory():
+                refs = getattr(self, '_form_ajax_refs', None) or {}
+                before = set(refs)
+
+                value = func(self, *args, **kwargs)
+
+                return value, dict((name, loader)
+                                   for name, loader in iteritems(refs)
+                                   if name not in before)
+
+            value, refs = scaffold_cache.get_or_create(key, factory)
+
+            for name, loader in iteritems(refs):
+                self._form_ajax_refs.setdefault(name, loader)
+
+            if isinstance(value, FormMeta):
+                value = copy_form_class(value)
+
+            return value
+
+        return inner
+
+    return decorator
+
+
+def clear_scaffold_cache():
+    """
+        Drop all shared scaffolding, for example after changing view
+        options at runtime.
+    """
+    scaffold_cache.clear()
+
+
+def _warm_up_model(model, seen):
+    if model is None or model in seen:
+        return
+
+    seen.add(model)
+
+    opts = model._meta
+    opts.get_fields(include_hidden=True)
+    opts.concrete_fields
+    opts.local_concrete_fields
+
+    for field in opts.get_fields():
+        _warm_up_model(field.related_model, seen)
+
+
+def _warm_up_templates(view):
+    app = view.admin.app if view.admin is not None else None
+
+    if app is None:
+        return
+
+    for name in ('list_template', 'create_template', 'edit_template',
+                 'details_template', 'create_modal_template',
+                 'edit_modal_template', 'details_modal_template'):
+        template = getattr(view, name, None)
+
+        if template:
+            app.jinja_env.get_template(template)
+
+
+def warm_up(admin, gc_freeze=True, trace_memory=True):
+    """
+        Build all scaffolding of every `DjangoModelView` registered in the
+        admin, so that it can be shared copy-on-write by worker processes
+        forked afterwards, for example from the gunicorn `on_starting` hook
+        or an application preloaded with `--preload`::
+
+            app = create_app()
+            warm_up(admin)
+
+        For every view this runs deferred scaffolding (forms, inline forms,
+        filters, search and AJAX loaders), fills Django `_meta` field
+        caches of the model and of the models it relates to and compiles
+        the view templates. Afterwards the garbage collector is run and,
+        when `gc_freeze` is set, everything allocated so far is moved to the
+        permanent generation with `gc.freeze()`, so that collections in
+        the workers do not touch, and thereby copy, the shared pages.
+
+        Returns a list of `(endpoint, seconds, bytes)` tuples, one per
+        view, with the time spent and the net memory allocated by its
+        warm-up. Memory is reported as None when `trace_memory` is off.
+
+        :param admin:
+            `flask_admin.Admin` instance
+        :param gc_freeze:
+            Call `gc.freeze()` when done
+        :param trace_memory:
+            Measure memory allocated per view with `tracemalloc`
+    """
+    from .view import DjangoModelView
+
+    tracing = trace_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+
+    seen = set()
+    report = []
+    started = time.time()
+
+    try:
+        for view in admin._views:
+            if not isinstance(view, DjangoModelView):
+                continue
+
+            view_started = time.time()
+            memory = tracemalloc.get_traced_memory()[0] if trace_memory \
+                else None
+
+            view.ensure_scaffolded()
+
+            for loader in itervalues(view._form_ajax_refs):
+                _warm_up_model(getattr(loader, 'model', None), seen)
+
+            _warm_up_model(view.model, seen)
+            _warm_up_templates(view)
+
+            if trace_memory:
+                memory = tracemalloc.get_traced_memory()[0] - memory
+
+            report.append((view.endpoint, time.time() - view_started, memory))
+    finally:
+        if tracing:
+            tracemalloc.stop()
+
+    gc.collect()
+
+    if gc_freeze and hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    for endpoint, seconds, memory in report:
+        log.info('Warmed up %s in %.3fs, %s bytes', endpoint, seconds,
+                 memory if memory is not None else 'unknown')
+
+    log.info('Warmed up %d views in %.3fs, %d objects frozen', len(report),
+             time.time() - started,
+             gc.get_freeze_count() if hasattr(gc, 'get_freeze_count') else 0)
+
+    return report
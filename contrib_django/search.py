@@ -0,0 +1,453 @@
+import logging
+import re
+
+from django.db import connections, DatabaseError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete
+
+from .tools import parse_like_term
+
+log = logging.getLogger("flask-admin.django")
+
+
+def split_search_term(search_term):
+    """
+        Split search term into list of `(operation, term)` tuples, one per
+        word, as understood by :func:`~contrib_django.tools.parse_like_term`.
+    """
+    result = []
+
+    for value in search_term.split(' '):
+        if not value:
+            continue
+
+        search_type, term = parse_like_term(value)
+        if term:
+            result.append((search_type, term))
+
+    return result
+
+
+class BaseSearchBackend(object):
+    """
+        Base search backend.
+
+        The view calls :meth:`bind` once it knows its searchable fields and
+        :meth:`search` for every list request with a search term.
+    """
+
+    def bind(self, view):
+        """
+            Prepare the backend for a view, for example to connect model
+            signals keeping an index in sync.
+
+            :param view:
+                Model view
+        """
+        pass
+
+    def get_like_filter(self, fields, search_type, term):
+        """
+            Return `Q` matching the term with a plain field lookup.
+        """
+        stmt = None
+
+        for field in fields:
+            q = Q(**{"{}__{}".format(field, search_type): term})
+
+            if stmt is None:
+                stmt = q
+            else:
+                stmt |= q
+
+        return stmt
+
+    def search(self, view, query, search_term):
+        """
+            Apply search term to the query.
+
+            :param view:
+                Model view
+            :param query:
+                QuerySet
+            :param search_term:
+                Search term
+        """
+        raise NotImplementedError()
+
+    def build_index(self, view, using=None):
+        """
+            Create or rebuild the search index for the view model.
+
+            :param view:
+                Model view
+            :param using:
+                Database alias, defaults to the model default database
+        """
+        pass
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """
+        Match every word with `LIKE` against every searchable field. Does
+        not need an index, but can not use one either for `contains`
+        searches.
+    """
+
+    def search(self, view, query, search_term):
+        stmt = None
+
+        for search_type, term in split_search_term(search_term):
+            q = self.get_like_filter(view._search_fields, search_type, term)
+
+            if stmt is None:
+                stmt = q
+            else:
+                stmt |= q
+
+        if stmt is None:
+            return query
+
+        return query.filter(stmt)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+        PostgreSQL full-text search with a GIN index.
+
+        By default searches a `to_tsvector()` expression over the searchable
+        fields, served by an expression index created by
+        :meth:`build_index`. Alternatively, point `vector_field` at a
+        `SearchVectorField` on the model; it is kept up to date on save.
+
+        Operators of the search term are mapped as follows: `^term` becomes
+        a prefix query, `=term` falls back to an exact field lookup and `*`
+        is ignored, as full-text search is case insensitive.
+    """
+
+    def __init__(self, config='simple', vector_field=None, index_name=None):
+        """
+            Constructor.
+
+            :param config:
+                Text search configuration, like `english`. It is spelled
+                out in the vector expression and in every query, as
+                PostgreSQL only indexes `to_tsvector()` with an explicit
+                configuration and only uses that index for queries with
+                the same one
+            :param vector_field:
+                Name of a `SearchVectorField` holding the document
+            :param index_name:
+                Name of the GIN index
+        """
+        self.config = config
+        self.vector_field = vector_field
+        self.index_name = index_name
+        self._vectors = {}
+
+    def get_vector(self, view):
+        from django.contrib.postgres.search import SearchVector
+
+        return SearchVector(*view._search_fields, config=self.config)
+
+    def get_index_name(self, view):
+        if self.index_name:
+            return self.index_name
+
+        return ('%s_search' % view.model._meta.db_table)[:30]
+
+    def bind(self, view):
+        if not self.config and not self.vector_field:
+            raise ValueError('PostgresSearchBackend requires a text search '
+                             'configuration to index an expression.')
+
+        if self.vector_field:
+            post_save.connect(
+                self._update_vector,
+                sender=view.model,
+                weak=False,
+                dispatch_uid='flask_admin_django.search.%s.%s' % (
+                    id(self), view.model._meta.label_lower))
+            self._vectors[view.model] = self.get_vector(view)
+
+    def _update_vector(self, sender, instance, raw=False, using=None,
+                       **kwargs):
+        if raw:
+            return
+
+        sender._default_manager.using(using).filter(pk=instance.pk).update(
+            **{self.vector_field: self._vectors[sender]})
+
+    def get_search_query(self, search_type, term):
+        from django.contrib.postgres.search import SearchQuery
+
+        if search_type.endswith('startswith'):
+            words = re.findall(r'\w+', term, re.UNICODE)
+
+            if not words:
+                return None
+
+            return SearchQuery(' & '.join('%s:*' % w for w in words),
+                               search_type='raw',
+                               config=self.config)
+
+        return SearchQuery(term, config=self.config)
+
+    def search(self, view, query, search_term):
+        search_query = None
+        stmt = None
+
+        for search_type, term in split_search_term(search_term):
+            if search_type.endswith('exact'):
+                q = self.get_like_filter(view._search_fields, search_type,
+                                         term)
+
+                stmt = q if stmt is None else stmt | q
+                continue
+
+            sq = self.get_search_query(search_type, term)
+
+            if sq is not None:
+                search_query = (sq if search_query is None else
+                                search_query | sq)
+
+        if search_query is not None:
+            if self.vector_field:
+                q = Q(**{self.vector_field: search_query})
+            else:
+                query = query.alias(_search_vector=self.get_vector(view))
+                q = Q(_search_vector=search_query)
+
+            stmt = q if stmt is None else stmt | q
+
+        if stmt is None:
+            return query
+
+        return query.filter(stmt)
+
+    def build_index(self, view, using=None):
+        from django.contrib.postgres.indexes import GinIndex
+
+        model = view.model
+        using = using or model._default_manager.db
+
+        if self.vector_field:
+            index = GinIndex(fields=[self.vector_field],
+                             name=self.get_index_name(view))
+            model._default_manager.using(using).update(
+                **{self.vector_field: self.get_vector(view)})
+        else:
+            index = GinIndex(self.get_vector(view),
+                             name=self.get_index_name(view))
+
+        connection = connections[using]
+
+        with connection.schema_editor() as editor:
+            editor.execute('DROP INDEX IF EXISTS %s' %
+                           editor.quote_name(index.name))
+            editor.add_index(model, index)
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """
+        SQLite FTS5 search over a shadow virtual table.
+
+        The table holds a copy of the searchable fields keyed by the
+        primary key, which must be an integer. It is created and filled by
+        :meth:`build_index` and kept in sync through `post_save` and
+        `post_delete` signals. Queryset `update()`, `bulk_create()` and
+        raw SQL bypass signals and require a rebuild.
+
+        FTS5 matches whole tokens: `term` matches the word, `^term` matches
+        words starting with it, `=term` falls back to an exact field lookup
+        and `*` is ignored, as FTS5 is case insensitive. Until the table is
+        built, searches fall back to `LIKE`.
+    """
+
+    def __init__(self, table_name=None):
+        """
+            Constructor.
+
+            :param table_name:
+                Name of the FTS5 table, defaults to `<db_table>_fts`
+        """
+        self.table_name = table_name
+        self._fields = {}
+        self._ready = set()
+
+    def get_table_name(self, model):
+        return self.table_name or '%s_fts' % model._meta.db_table
+
+    def bind(self, view):
+        model = view.model
+        self._fields[model] = list(view._search_fields)
+
+        uid = 'flask_admin_django.search.%s.%s' % (id(self),
+                                                   model._meta.label_lower)
+        post_save.connect(self._update_row, sender=model, weak=False,
+                          dispatch_uid=uid)
+        post_delete.connect(self._delete_row, sender=model, weak=False,
+                            dispatch_uid=uid)
+
+    def _is_ready(self, model, using):
+        key = (model, using)
+
+        if key not in self._ready:
+            connection = connections[using]
+
+            if connection.vendor != 'sqlite':
+                return False
+
+            with connection.cursor() as cursor:
+                tables = connection.introspection.table_names(cursor)
+
+            if self.get_table_name(model) not in tables:
+                return False
+
+            self._ready.add(key)
+
+        return True
+
+    def _execute(self, using, sql, params):
+        try:
+            with connections[using].cursor() as cursor:
+                cursor.execute(sql, params)
+        except DatabaseError:
+            log.exception('Failed to update search index.')
+
+    def _update_row(self, sender, instance, raw=False, using=None, **kwargs):
+        if not self._is_ready(sender, using):
+            return
+
+        fields = self._fields[sender]
+        qn = connections[using].ops.quote_name
+        table = qn(self.get_table_name(sender))
+
+        self._delete_row(sender, instance, using)
+        self._execute(
+            using, 'INSERT INTO %s (rowid, %s) VALUES (%s)' % (
+                table, ', '.join(qn(f) for f in fields),
+                ', '.join(['%s'] * (len(fields) + 1))),
+            [instance.pk] + [getattr(instance, f) for f in fields])
+
+    def _delete_row(self, sender, instance, using=None, **kwargs):
+        if not self._is_ready(sender, using):
+            return
+
+        self._execute(
+            using, 'DELETE FROM %s WHERE rowid = %%s' %
+            connections[using].ops.quote_name(self.get_table_name(sender)),
+            [instance.pk])
+
+    def get_match_term(self, search_type, term):
+        words = re.findall(r'\w+', term, re.UNICODE)
+
+        if not words:
+            return None
+
+        suffix = '*' if search_type.endswith('startswith') else ''
+        return ' '.join('"%s"%s' % (w, suffix) for w in words)
+
+    def search(self, view, query, search_term):
+        if not self._is_ready(view.model, query.db):
+            return LikeSearchBackend().search(view, query, search_term)
+
+        match = []
+        stmt = None
+
+        for search_type, term in split_search_term(search_term):
+            if search_type.endswith('exact'):
+                q = self.get_like_filter(view._search_fields, search_type,
+                                         term)
+
+                stmt = q if stmt is None else stmt | q
+                continue
+
+            value = self.get_match_term(search_type, term)
+            if value:
+                match.append('(%s)' % value)
+
+        if match:
+            table = connections[query.db].ops.quote_name(
+                self.get_table_name(view.model))
+
+            q = Q(pk__in=RawSQL(
+                'SELECT rowid FROM %s WHERE %s MATCH %%s' % (table, table),
+                [' OR '.join(match)]))
+
+            stmt = q if stmt is None else stmt | q
+
+        if stmt is None:
+            return query
+
+        return query.filter(stmt)
+
+    def build_index(self, view, using=None):
+        model = view.model
+        using = using or model._default_manager.db
+        fields = list(view._search_fields)
+
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        table = qn(self.get_table_name(model))
+        columns = ', '.join(qn(f) for f in fields)
+
+        source = ', '.join(qn(model._meta.get_field(f).column)
+                           for f in fields)
+
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS %s' % table)
+            cursor.execute('CREATE VIRTUAL TABLE %s USING fts5(%s)' %
+                           (table, columns))
+            cursor.execute(
+                'INSERT INTO %s (rowid, %s) SELECT %s, %s FROM %s' %
+                (table, columns, qn(model._meta.pk.column), source,
+                 qn(model._meta.db_table)))
+
+        self._fields[model] = fields
+        self._ready.add((model, using))
+
+
+def get_search_backend(backend):
+    """
+        Resolve `DjangoModelView.search_backend` into a backend instance.
+    """
+    if backend is None or backend == 'like':
+        return LikeSearchBackend()
+
+    if backend == 'postgres':
+        return PostgresSearchBackend()
+
+    if backend == 'fts5':
+        return SQLiteFTS5SearchBackend()
+
+    if isinstance(backend, BaseSearchBackend):
+        return backend
+
+    raise ValueError('Unknown search backend: %r' % (backend, ))
+
+
+def build_search_indexes(admin, using=None):
+    """
+        Create or rebuild search indexes of every `DjangoModelView`
+        registered in the admin. Meant to be run from a deployment script
+        or a Flask CLI command.
+
+        :param admin:
+            `flask_admin.Admin` instance
+        :param using:
+            Database alias
+    """
+    from .view import DjangoModelView
+
+    for view in admin._views:
+        if not isinstance(view, DjangoModelView):
+            continue
+
+        # Lazy views only know their search fields once scaffolded
+        view.ensure_scaffolded()
+
+        if view._search_supported:
+            log.info('Building search index for %s', view.endpoint)
+            view.build_search_index(using=using)
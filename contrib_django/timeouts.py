@@ -0,0 +1,90 @@
+import time
+from contextlib import contextmanager
+
+from django.db import connections, transaction, OperationalError
+
+# Number of SQLite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_STEPS = 1000
+
+
+@contextmanager
+def _timeout_postgresql(connection, seconds):
+    # SET LOCAL only lasts until the end of the transaction, so run the
+    # block in one and restore the previous value if it is an outer
+    # transaction that goes on.
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('statement_timeout', %s, true),"
+                           " current_setting('statement_timeout')",
+                           ['%dms' % max(int(seconds * 1000), 1)])
+            previous = cursor.fetchone()[1]
+
+        yield
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)",
+                           [previous])
+
+
+@contextmanager
+def _timeout_sqlite(connection, seconds):
+    deadline = time.time() + seconds
+
+    def handler():
+        # Non-zero return value interrupts the running statement
+        return 1 if time.time() > deadline else 0
+
+    connection.ensure_connection()
+    connection.connection.set_progress_handler(handler,
+                                               SQLITE_PROGRESS_STEPS)
+
+    try:
+        yield
+    finally:
+        connection.connection.set_progress_handler(None,
+                                                   SQLITE_PROGRESS_STEPS)
+
+
+_limiters = {
+    'postgresql': _timeout_postgresql,
+    'sqlite': _timeout_sqlite,
+}
+
+
+@contextmanager
+def statement_timeout(using, seconds):
+    """
+        Cancel statements run on the database within the block that take
+        longer than `seconds`. Supported on PostgreSQL, with
+        `statement_timeout`, and SQLite, with a progress handler. Other
+        databases run without limit.
+
+        A cancelled statement raises a `DatabaseError`, see
+        :func:`is_timeout_error`.
+
+        :param using:
+            Database alias
+        :param seconds:
+            Time limit per statement, None for no limit
+    """
+    connection = connections[using]
+    limiter = _limiters.get(connection.vendor)
+
+    if not seconds or limiter is None:
+        yield
+        return
+
+    with limiter(connection, seconds):
+        yield
+
+
+def is_timeout_error(ex):
+    """
+        Return True if the database error was raised by a statement
+        cancelled by :func:`statement_timeout`.
+    """
+    # PostgreSQL query_canceled
+    if getattr(ex.__cause__, 'pgcode', None) == '57014':
+        return True
+
+    return isinstance(ex, OperationalError) and 'interrupted' in str(ex)
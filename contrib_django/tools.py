@@ -1,3 +1,8 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from flask_admin._compat import as_unicode
+
+
 def get_primary_key(model):
     return model._meta.pk.name
 
@@ -34,3 +39,109 @@ def parse_like_term(term):
     if case_insensitive:
         oper = 'i' + oper
     return oper, term
+
+
+def get_related_field(model, name):
+    """
+        Return model field or reverse relation by attribute name.
+    """
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        for rel in model._meta.related_objects:
+            if rel.get_accessor_name() == name:
+                return rel
+
+    return None
+
+
+def get_lookup_field(model, path):
+    """
+        Resolve field lookup path, like `title`, `author__name` or
+        `author.name`.
+
+        Returns `(field, lookup, multi_valued)` tuple, where `lookup` is the
+        path in `__` notation and `multi_valued` tells if the path crosses
+        a reverse foreign key or many-to-many relation, or None if the path
+        does not exist.
+    """
+    names = path.replace('.', '__').split('__')
+    multi_valued = False
+    field = None
+
+    for name in names:
+        if field is not None:
+            if not field.is_relation:
+                return None
+
+            model = field.related_model
+
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+        if field.many_to_many or field.one_to_many:
+            multi_valued = True
+
+    return field, '__'.join(names), multi_valued
+
+
+def get_related_paths(model, names):
+    """
+        Split dotted attribute paths into `select_related` and
+        `prefetch_related` lookups, so that rendering them does not issue
+        a query per row.
+
+        Forward foreign keys and one-to-one relations are joined, the path
+        from the first reverse or many-to-many relation onwards is
+        prefetched.
+
+        :param model:
+            Django model class
+        :param names:
+            Attribute paths, like `author` or `author.publisher.name`
+    """
+    select = set()
+    prefetch = set()
+
+    for name in names:
+        current = model
+        path = []
+        joined = None
+
+        for part in name.split('.'):
+            field = get_related_field(current, part)
+
+            if (field is None or not field.is_relation or
+                    field.related_model is None):
+                break
+
+            if joined is None and (field.many_to_many or field.one_to_many):
+                joined = list(path)
+
+            path.append(part)
+            current = field.related_model
+
+        if joined is None:
+            joined = path
+        elif path:
+            prefetch.add('__'.join(path))
+
+        if joined:
+            select.add('__'.join(joined))
+
+    return sorted(select), sorted(prefetch)
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """
+        JSON encoder for exported values. Dates, decimals and UUIDs are
+        handled by Django, anything else is exported as text.
+    """
+
+    def default(self, o):
+        try:
+            return super(ExportJSONEncoder, self).default(o)
+        except TypeError:
+            return as_unicode(o)
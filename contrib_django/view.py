@@ -1,22 +1,82 @@
-from flask import request, flash, abort, Response
+from flask import (request, flash, abort, Response, g, has_request_context,
+                   after_this_request, session,
+                   redirect, stream_with_context, current_app)
+from werkzeug.utils import secure_filename
 from flask_admin.babel import gettext, ngettext, lazy_gettext
 from wtforms.validators import ValidationError as wtfValidationError
 from flask_admin.model import BaseModelView
+from flask_admin.base import expose
+from flask_admin.helpers import get_redirect_target
+from flask_admin.model.helpers import get_mdict_item_or_list
 from django.db.models import fields as django_fields
 from . import filters
-from .tools import get_primary_key, parse_like_term
+from .filters import BaseDjangoFilter
+from .tools import (get_primary_key, get_related_paths, get_lookup_field,
+                    ExportJSONEncoder)
 from flask_admin.actions import action
-from .ajax import create_ajax_loader
-from .form import get_form, CustomModelConverter, InlineModelConverter, save_inline
+from .ajax import (create_ajax_loader, prefetch_ajax_data,
+                   prefetch_ajax_relations)
+from .cache import get_list_cache
+from .counts import get_count_strategy, get_count_executor, submit_count
+from .search import get_search_backend
+from .metrics import get_metrics_sink, record_queries, record_into
+from .routing import get_read_alias, mark_write
+from .timeouts import statement_timeout, is_timeout_error
+from .scaffold import cached_scaffold
+from .pagination import (get_list_state, encode_cursor, decode_cursor,
+                         get_keyset_fields, get_seek_filter)
+from .form import (get_form, CustomModelConverter, InlineModelConverter,
+                   ColumnModelConverter, save_inline)
+from flask_admin.form import recreate_field
+from wtforms.fields import BooleanField
 from flask_admin.model.form import create_editable_list_form
-from django.db.models import Q
-from django.core.paginator import Paginator
+from django.db import connections, router, transaction, DatabaseError
+from django.db.models.deletion import Collector
+from django.db.models import Count
+from django.db.models.functions import Substr, Trunc
+import datetime
+import hashlib
+import json
 import logging
-from flask_admin._compat import itervalues, as_unicode
-from django.core.exceptions import ValidationError
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask_admin._compat import (itervalues, as_unicode, string_types,
+                                 text_type)
+from django.core.exceptions import ValidationError, FieldDoesNotExist
+from django.utils import timezone
 
 log = logging.getLogger("flask-admin.django")
 
+SET_FIELDS_TEMPLATE = """
+{% extends admin_base_template %}
+{% import 'admin/lib.html' as lib with context %}
+
+{% block body %}
+  <h3>{{ _ngettext('Set fields of %(count)s record',
+                   'Set fields of %(count)s records',
+                   ids|length, count=ids|length) }}</h3>
+  <form action="{{ get_url('.action_view') }}" method="POST"
+        class="admin-form form-horizontal">
+    <input type="hidden" name="action" value="set_fields">
+    <input type="hidden" name="url" value="{{ return_url }}">
+    <input type="hidden" name="_set_fields" value="1">
+    {% for id in ids %}
+    <input type="hidden" name="rowid" value="{{ id }}">
+    {% endfor %}
+    {{ lib.render_form_fields(form) }}
+    <div class="form-group control-group">
+      <div class="col-md-offset-2 col-md-10 controls">
+        <input type="submit" class="btn btn-primary"
+               value="{{ _gettext('Save') }}">
+        <a href="{{ return_url }}" class="btn btn-default" role="button">
+          {{ _gettext('Cancel') }}</a>
+      </div>
+    </div>
+  </form>
+{% endblock %}
+"""
+
 
 def format_error(error):
     if isinstance(error, ValidationError):
@@ -34,6 +94,303 @@ class DjangoModelView(BaseModelView):
     inline_model_form_converter = InlineModelConverter
     inline_models = []
     fast_mass_delete = False
+    """
+        Delete records of the delete action with queryset deletes, without
+        loading them and calling `on_model_delete`/`after_model_delete`.
+    """
+
+    action_delete_chunk_size = 500
+    """
+        Number of records the delete action handles per transaction. Keeps
+        memory, lock duration and the number of query parameters bounded
+        when deleting many records.
+    """
+
+    action_set_fields_list = None
+    """
+        List of fields the "Set fields" action can change on the selected
+        records, for example::
+
+            class PostView(DjangoModelView):
+                action_set_fields_list = ['status', 'author']
+
+        The new values are entered once, validated with the form field of
+        each column and written with one `UPDATE` statement per chunk of
+        records. Foreign keys must be listed in `form_ajax_refs`.
+    """
+
+    action_set_fields_per_object = False
+    """
+        Load and save the records of the "Set fields" action one by one
+        with :meth:`update_model`, so that `on_model_change` and
+        `after_model_change` run for each of them. Bulk `UPDATE` does not
+        call model `save()` nor send signals.
+    """
+
+    action_set_fields_template = None
+    """
+        Template of the "Set fields" form. Defaults to a built-in template
+        extending the admin base template.
+    """
+
+    action_set_fields_converter = ColumnModelConverter
+    """
+        Model converter of the "Set fields" form. Unlike
+        `model_form_converter` it also converts plain columns.
+    """
+
+    action_update_chunk_size = 1000
+    """
+        Number of records the "Set fields" action updates per transaction.
+    """
+
+    pagination_mode = 'offset'
+    """
+        List pagination mode. `offset` pages with LIMIT/OFFSET. `keyset`
+        seeks past the last row of the previous page using the current sort
+        column plus the primary key as a tie-breaker, so deep pages cost the
+        same as the first one. Keyset cursors are attached to the pager
+        links of adjacent pages; jumping to an arbitrary page, sorting on a
+        nullable or related column falls back to offset paging.
+    """
+
+    keyset_cursor_arg = 'cursor'
+    """
+        Name of the list URL argument carrying the keyset cursor.
+    """
+
+    count_strategy = None
+    """
+        How the list view counts rows, unless `simple_list_pager` is set.
+        One of `exact` (default), `cached` (TTL cache invalidated on
+        save/delete), `estimate` (planner statistics, shown as "about N")
+        or a :class:`~contrib_django.counts.BaseCountStrategy` instance.
+    """
+
+    concurrent_count = False
+    """
+        Count rows on a thread pool while the list page is fetched in the
+        request thread, so list latency is the longer of the two queries
+        rather than their sum. True for the pool of
+        :data:`~contrib_django.counts.COUNT_POOL_SIZE` threads shared by
+        all views, or a `concurrent.futures.Executor` instance.
+
+        Each worker thread runs the count on its own Django connection,
+        closed afterwards unless `CONN_MAX_AGE` keeps it open. Counts run
+        in the request thread inside transactions, whose uncommitted rows
+        other connections can not see, and on in-memory SQLite databases.
+    """
+
+    count_timeout = None
+    """
+        Number of seconds, from the start of the list query, to wait for a
+        concurrent count. When it is exceeded the page is shown with a
+        pager without total, while the count finishes in the background.
+        None to always wait.
+    """
+
+    query_timeout = None
+    """
+        Number of seconds the count and page queries of the list view,
+        including search and filters, may run before the database cancels
+        them. Enforced on PostgreSQL with `statement_timeout` and on
+        SQLite with a progress handler, see
+        :func:`~contrib_django.timeouts.statement_timeout`.
+
+        A cancelled count shows the page with a pager without total, a
+        cancelled page query shows an empty list asking to narrow the
+        search.
+    """
+
+    column_auto_select_related = True
+    """
+        Detect related models displayed in the list view, including dotted
+        `column_list` and `column_formatters` paths, and load them with the
+        page: forward foreign keys and one-to-one relations through
+        `select_related`, reverse and many-to-many relations through
+        `prefetch_related`. Exports detect theirs from the export columns.
+    """
+
+    column_select_related_list = None
+    """
+        List of `select_related` lookups for the list and export queries.
+        Overrides the automatically detected joins when set, for example::
+
+            class PostView(DjangoModelView):
+                column_select_related_list = ['author', 'author__publisher']
+    """
+
+    column_prefetch_related_list = None
+    """
+        List of `prefetch_related` lookups for the list and export queries.
+        Overrides the automatically detected prefetches when set.
+    """
+
+    column_list_projection = None
+    """
+        Limit the model columns fetched by the list and export queries:
+
+        * `None` - load full model instances (default)
+        * `defer` - skip text, binary and JSON columns that are not
+          displayed
+        * `only` - load only the displayed columns, the primary key and
+          joined foreign keys
+
+        Formatters and templates reading attributes of other columns cause
+        a query per row, so only enable it for views that do not.
+    """
+
+    column_max_length = None
+    """
+        Dictionary of column name to maximum number of characters loaded
+        for the list view. The value is truncated in SQL, so long bodies
+        never leave the database::
+
+            class PostView(DjangoModelView):
+                column_max_length = {'body': 200}
+
+        Columns with a formatter, export and editable columns are never
+        truncated, as formatters read the full model attribute.
+    """
+
+    _deferred_field_types = ('TextField', 'BinaryField', 'JSONField')
+
+    filter_distinct = True
+    """
+        Add `DISTINCT` to the list query when an applied filter joins a
+        reverse foreign key or many-to-many relation, which would otherwise
+        return a row once per matching related row.
+    """
+
+    column_facet_list = None
+    """
+        List of columns the facet endpoint (`/facets/`) counts rows for,
+        as lookup paths. Supports booleans, fields with choices, foreign
+        keys and dates, which are counted per `column_facet_date_bucket`.
+        Defaults to the supported columns of `column_filters`.
+    """
+
+    column_facet_date_bucket = 'month'
+    """
+        Bucket of date facets: `year`, `quarter`, `month`, `week` or `day`.
+    """
+
+    column_facet_limit = 50
+    """
+        Maximum number of options returned per facet, most frequent first.
+    """
+
+    query_metrics = None
+    """
+        Record SQL statements run by every request of the view, with
+        Django `execute_wrapper`, and publish the per-endpoint query
+        count, database time and rows to a sink: `logging`, `statsd`
+        (UDP to 127.0.0.1:8125), `prometheus` (shared
+        :data:`~contrib_django.metrics.prometheus_sink`) or a
+        :class:`~contrib_django.metrics.BaseMetricsSink` instance.
+    """
+
+    query_count_budget = None
+    """
+        Log a warning with the slowest statements when a request runs more
+        SQL statements than this. Enables recording on its own.
+    """
+
+    query_time_budget = None
+    """
+        Log a warning with the slowest statements when a request spends
+        more seconds in the database than this.
+    """
+
+    scaffold_cache = True
+    """
+        Share scaffolded form classes and filters with other views of the
+        same model having identical form, filter and inline options, see
+        :data:`~contrib_django.scaffold.scaffold_cache`. Options are
+        compared by value for dictionaries and lists and by identity for
+        other objects.
+
+        Set to False for views that modify their generated form classes or
+        filter objects after scaffolding.
+    """
+
+    search_backend = None
+    """
+        Backend running `column_searchable_list` searches. One of `like`
+        (default, `LIKE` per word and field), `postgres` (full-text search
+        over a GIN index), `fts5` (SQLite FTS5 shadow table) or a
+        :class:`~contrib_django.search.BaseSearchBackend` instance.
+
+        Full-text backends need their index built with
+        :meth:`build_search_index` or
+        :func:`~contrib_django.search.build_search_indexes`.
+    """
+
+    list_cache = None
+    """
+        Cache of list pages, keyed by page, sort, search, filters and page
+        size. Stores the count and primary keys of each page and is
+        invalidated when the model is saved, deleted or its many-to-many
+        relations change. One of `memory` (per-process LRU), `django`
+        (Django `default` cache) or a :class:`~contrib_django.cache.ListCache`
+        instance. Disabled by default.
+    """
+
+    export_chunk_size = 2000
+    """
+        Number of rows fetched per round trip when streaming an export.
+        Exports iterate the query with `QuerySet.iterator()`, which uses
+        server-side cursors on PostgreSQL, so memory stays bounded
+        regardless of the number of exported rows.
+
+        Add `ndjson` to `export_types` to enable newline-delimited JSON
+        export next to CSV.
+    """
+
+    lazy_scaffold = False
+    """
+        Defer building forms, inline forms, filters and search until the
+        first request handled by the view, or an explicit
+        :meth:`ensure_scaffolded` call. Startup then only reads model
+        metadata, which helps applications with many rarely used views.
+    """
+
+    read_using = None
+    """
+        Database alias, or callable taking the model and returning one,
+        used for read-only queries: list pages, counts, search, facets,
+        exports, the details page and AJAX lookups of `form_ajax_refs`.
+        Writes, and reads done to edit or delete a record, stay on the
+        database chosen by the Django routers. For example::
+
+            class PostView(DjangoModelView):
+                read_using = 'replica'
+    """
+
+    read_after_write_window = 5
+    """
+        Number of seconds reads of a session stay on the primary database
+        after it has created, updated or deleted a record, to hide replica
+        lag. Needs the Flask session, so the application `SECRET_KEY`. Set
+        to None to always read from `read_using`.
+    """
+
+    version_field = None
+    """
+        Name of a field changing on every save, like an `auto_now`
+        `updated_at` timestamp or a version counter. When set, GET requests
+        of the details and edit pages first fetch only the primary key and
+        this field to build an `ETag`, and `Last-Modified` for timezone
+        aware timestamps, and answer `304 Not Modified` when the browser
+        copy is current, without loading the record nor rendering the
+        page.
+
+        Only the columns of the record itself are covered, not CSRF
+        tokens, related records nor formatter output. Details pages
+        showing relations, properties or formatted columns, and edit pages
+        whose form has a CSRF token, inline rows or AJAX references, are
+        always rendered.
+    """
 
     def __init__(self,
                  model,
@@ -59,6 +416,15 @@ class DjangoModelView(BaseModelView):
             menu_icon_value=menu_icon_value)
 
         self._primary_key = self.scaffold_pk()
+        self._count_strategy = get_count_strategy(self.count_strategy)
+        self._count_executor = get_count_executor(self.concurrent_count)
+        self._list_cache = get_list_cache(self.list_cache)
+        self._metrics_sink = get_metrics_sink(self.query_metrics)
+
+        if self._list_cache is not None:
+            self._list_cache.bind(self)
+        self._select_related, self._prefetch_related = \
+            self.scaffold_auto_joins()
 
     def scaffold_pk(self):
         return get_primary_key(self.model)
@@ -85,6 +451,33 @@ class DjangoModelView(BaseModelView):
 
         return columns
 
+    def scaffold_auto_joins(self):
+        """
+            Return `(select_related, prefetch_related)` lookups for the
+            list query.
+        """
+        return self._get_joins(self._list_columns, self.column_formatters)
+
+    def _get_joins(self, columns, formatters):
+        """
+            Return `(select_related, prefetch_related)` lookups loading
+            the related models of the columns, following
+            `column_auto_select_related` and the explicit lookup lists.
+        """
+        select, prefetch = [], []
+
+        if self.column_auto_select_related:
+            select, prefetch = get_related_paths(
+                self.model, self._get_column_paths(columns, formatters))
+
+        if self.column_select_related_list is not None:
+            select = list(self.column_select_related_list)
+
+        if self.column_prefetch_related_list is not None:
+            prefetch = list(self.column_prefetch_related_list)
+
+        return select, prefetch
+
     def scaffold_sortable_columns(self):
         columns = dict()
 
@@ -96,6 +489,9 @@ class DjangoModelView(BaseModelView):
         return columns
 
     def init_search(self):
+        if self._scaffold_deferred:
+            return False
+
         if self.column_searchable_list:
             for ppp in self.column_searchable_list:
                 field_type = ppp
@@ -110,36 +506,198 @@ class DjangoModelView(BaseModelView):
 
                 self._search_fields.append(ppp)
 
+        if self._search_fields:
+            self._search_backend = get_search_backend(self.search_backend)
+            self._search_backend.bind(self)
+
         return bool(self._search_fields)
 
+    @cached_scaffold('filter_converter', 'column_labels')
     def scaffold_filters(self, name):
-        if isinstance(name, str):
-            attr = getattr(self.model, name, None)
-        else:
-            attr = name
+        if isinstance(name, string_types):
+            resolved = get_lookup_field(self.model, name)
 
-        if attr is None:
-            raise Exception('Failed to find field for filter: %s' % name)
+            if resolved is None:
+                raise Exception('Failed to find field for filter: %s' % name)
+
+            field, column, _ = resolved
+        else:
+            # Model field or its class attribute
+            field = getattr(name, 'field', name)
+            column = field.name
 
         # Check if field is in different model
-        if attr.model_class != self.model:
+        if field.model != self.model:
             visible_name = '%s / %s' % (
-                self.get_column_name(attr.model_class.__name__),
-                self.get_column_name(attr.name))
+                self.get_column_name(field.model.__name__),
+                self.get_column_name(field.name))
         else:
-            if not isinstance(name, str):
-                visible_name = self.get_column_name(attr.name)
+            if not isinstance(name, string_types):
+                visible_name = self.get_column_name(field.name)
             else:
                 visible_name = self.get_column_name(name)
 
-        type_name = type(attr).__name__
-        flt = self.filter_converter.convert(type_name, attr, visible_name)
+        type_name = field.get_internal_type()
+        flt = self.filter_converter.convert(type_name, column, visible_name,
+                                            field=field, model=self.model)
 
         return flt
 
+    def _get_filter_groups(self):
+        groups = super(DjangoModelView, self)._get_filter_groups()
+
+        # Options loaded from the database are refreshed on every render
+        for items in itervalues(groups or {}):
+            for item in items:
+                flt = self._filters[item['index']]
+
+                if isinstance(flt.options, filters.DistinctOptions):
+                    options = flt.get_options(self)
+                    item['options'] = ([(k, text_type(v)) for k, v in options]
+                                       if options else None)
+
+        return groups
+
+    def scaffold_facets(self):
+        """
+            Return list of `(column, field, kind)` tuples of facet columns,
+            where kind is one of `bool`, `choices`, `fk` or `date`.
+        """
+        if self.column_facet_list is not None:
+            columns = list(self.column_facet_list)
+        else:
+            columns = []
+
+            for flt in self._filters or ():
+                column = getattr(flt, 'column', None)
+
+                if isinstance(column, string_types) and column not in columns:
+                    columns.append(column)
+
+        result = []
+
+        for column in columns:
+            resolved = get_lookup_field(self.model, column)
+
+            if resolved is None:
+                if self.column_facet_list is not None:
+                    raise Exception('Failed to find field for facet: %s' %
+                                    column)
+                continue
+
+            field, path, _ = resolved
+
+            if field.choices:
+                kind = 'choices'
+            elif field.many_to_one or field.one_to_one:
+                kind = 'fk'
+            elif isinstance(field, django_fields.BooleanField):
+                kind = 'bool'
+            elif isinstance(field, django_fields.DateField):
+                kind = 'date'
+            else:
+                continue
+
+            result.append((path, field, kind))
+
+        return result
+
+    def get_facet_counts(self, search, filters):
+        """
+            Count rows matched by the list query per option of every facet
+            column, with one grouped query per column.
+
+            Returns a list of dictionaries with `column`, `label` and
+            `options`, a list of `{'value', 'label', 'count'}` dictionaries.
+
+            :param search:
+                Search criteria
+            :param filters:
+                List of applied filters
+        """
+        self.ensure_scaffolded()
+
+        query = self._get_list_query(search, filters).order_by()
+        result = []
+
+        for column, field, kind in self._facets:
+            _, _, multi_valued = get_lookup_field(self.model, column)
+            count = Count('pk', distinct=multi_valued or query.query.distinct)
+
+            if kind == 'date':
+                rows = (query.annotate(_facet=Trunc(
+                    column, self.column_facet_date_bucket,
+                    output_field=django_fields.DateField()))
+                    .values('_facet'))
+            else:
+                rows = query.values(column)
+
+            rows = list(rows.annotate(_count=count).order_by('-_count')
+                        [:self.column_facet_limit])
+
+            key = '_facet' if kind == 'date' else column
+            values = [row[key] for row in rows]
+            labels = self._get_facet_labels(field, kind, values)
+
+            result.append({
+                'column': column,
+                'label': as_unicode(self.get_column_name(
+                    column.replace('__', '.'))),
+                'options': [{
+                    'value': value,
+                    'label': labels.get(value, value),
+                    'count': row['_count']
+                } for value, row in zip(values, rows)]
+            })
+
+        return result
+
+    def _get_facet_labels(self, field, kind, values):
+        if kind == 'choices':
+            return dict((value, as_unicode(label))
+                        for value, label in field.flatchoices)
+
+        if kind == 'fk':
+            related = field.related_model._default_manager.in_bulk(
+                [value for value in values if value is not None])
+            return dict((pk, as_unicode(obj)) for pk, obj in related.items())
+
+        if kind == 'bool':
+            return {True: gettext('Yes'), False: gettext('No')}
+
+        return {}
+
+    @expose('/facets/')
+    def facets_view(self):
+        """
+            Facet counts of the current list search and filters as JSON.
+        """
+        view_args = self._get_list_extra_args()
+        state = get_list_state(None, False, view_args.search,
+                               view_args.filters, None)
+
+        facets = None
+        if self._list_cache is not None:
+            facets = self._list_cache.get_facets(self, state)
+
+        if facets is None:
+            facets = self.get_facet_counts(view_args.search,
+                                           view_args.filters)
+
+            if self._list_cache is not None:
+                self._list_cache.set_facets(self, state, facets)
+
+        return Response(json.dumps(facets, cls=ExportJSONEncoder),
+                        mimetype='application/json')
+
     def is_valid_filter(self, _filter):
         return isinstance(_filter, filters.BaseDjangoFilter)
 
+    @cached_scaffold('form_base_class', 'form_columns', 'form_excluded_columns',
+                     'form_args', 'form_overrides', 'form_extra_fields',
+                     'form_ajax_refs', 'inline_models', 'model_form_converter',
+                     'inline_model_form_converter', 'read_using',
+                     'read_after_write_window')
     def scaffold_form(self):
         form_class = get_form(
             self.model,
@@ -155,6 +713,8 @@ class DjangoModelView(BaseModelView):
 
         return form_class
 
+    @cached_scaffold('form_base_class', 'column_editable_list', 'form_overrides',
+                     'form_ajax_refs', 'model_form_converter')
     def scaffold_list_form(self, widget=None, validators=None):
         """
             Create form for the `index_view` using only the columns from
@@ -176,6 +736,320 @@ class DjangoModelView(BaseModelView):
         return create_editable_list_form(self.form_base_class, form_class,
                                          widget)
 
+    @cached_scaffold('form_base_class', 'action_set_fields_list', 'form_args',
+                     'form_overrides', 'form_ajax_refs',
+                     'action_set_fields_converter', 'column_labels')
+    def scaffold_set_fields_form(self):
+        """
+            Create form for the "Set fields" action: a checkbox enabling
+            each column of `action_set_fields_list`, followed by the form
+            field of the column.
+        """
+        if not self.action_set_fields_list:
+            return None
+
+        form_class = get_form(
+            self.model,
+            self.action_set_fields_converter(self),
+            base_class=self.form_base_class,
+            only=self.action_set_fields_list,
+            field_args=self.form_args)
+
+        attrs = {}
+
+        for name in self.action_set_fields_list:
+            field = self.model._meta.get_field(name)
+            unbound = getattr(form_class, name, None)
+
+            if unbound is None or field.many_to_many:
+                raise ValueError(
+                    'Field %s of model %s can not be set by the "Set fields" '
+                    'action.' % (name, self.model))
+
+            attrs['set_%s' % name] = BooleanField(
+                gettext('Set %(name)s', name=self.get_column_name(name)))
+            attrs[name] = recreate_field(unbound)
+
+        return type(self.model.__name__ + 'SetFieldsForm',
+                    (self.form_base_class, ), attrs)
+
+    def _refresh_cache(self):
+        self._scaffold_lock = threading.Lock()
+        self._scaffold_pending = self._scaffold_deferred = self.lazy_scaffold
+
+        if self.lazy_scaffold:
+            # Placeholders until ensure_scaffolded() runs
+            self._create_form_class = self._edit_form_class = None
+            self._form_create_rules = self._form_edit_rules = None
+
+        super(DjangoModelView, self)._refresh_cache()
+
+    def ensure_scaffolded(self):
+        """
+            Build forms, filters and search of a view created with
+            `lazy_scaffold`. Runs once, even when called concurrently from
+            several threads; later calls return immediately.
+        """
+        if not self._scaffold_pending:
+            return
+
+        with self._scaffold_lock:
+            if not self._scaffold_pending:
+                return
+
+            self._scaffold_deferred = False
+
+            self._refresh_forms_cache()
+            self._search_supported = self.init_search()
+            self._refresh_filters_cache()
+            self._refresh_form_rules_cache()
+
+            self._validate_form_class(self._form_edit_rules,
+                                      self._edit_form_class)
+            self._validate_form_class(self._form_create_rules,
+                                      self._create_form_class)
+
+            self._scaffold_pending = False
+
+    def _handle_view(self, name, **kwargs):
+        response = super(DjangoModelView, self)._handle_view(name, **kwargs)
+
+        if response is None:
+            self.ensure_scaffolded()
+            response = self._handle_conditional_get(name)
+
+        return response
+
+    def _get_request_version(self, name):
+        """
+            Return `(token, last_modified)` tuple identifying the content
+            of the page, or None if the request can not be validated.
+        """
+        # Pending flashed messages are shown by the next rendered page
+        if request.method != 'GET' or session.get('_flashes'):
+            return None
+
+        if ((name == 'details_view' and self.can_view_details and
+                self._is_details_page_versioned() or
+                name == 'edit_view' and self.can_edit and
+                self._is_edit_page_versioned()) and self.version_field):
+            _id = get_mdict_item_or_list(request.args, 'id')
+            version = self.get_version(_id) if _id is not None else None
+
+            if version is None:
+                return None
+
+            last_modified = version[1]
+            if (not isinstance(last_modified, datetime.datetime) or
+                    last_modified.tzinfo is None):
+                last_modified = None
+
+            return version, last_modified
+
+        return None
+
+    def _is_details_page_versioned(self):
+        """
+            Return True if the record version identifies the details page,
+            that is it only shows concrete columns of the record, without
+            formatters.
+        """
+        formatters = self.column_formatters_detail or {}
+
+        for name, _ in self._details_columns:
+            if not isinstance(name, string_types) or name in formatters:
+                return False
+
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return False
+
+            if not field.concrete or field.is_relation:
+                return False
+
+        return True
+
+    def _is_edit_page_versioned(self):
+        """
+            Return True if the record version identifies the edit page,
+            that is its form renders no CSRF token, inline rows nor labels
+            of related records.
+        """
+        meta = getattr(self._edit_form_class, 'Meta', None)
+
+        return not (getattr(meta, 'csrf', False) or self.inline_models or
+                    self._form_ajax_refs)
+
+    def _handle_conditional_get(self, name):
+        """
+            Answer `304 Not Modified` when the browser copy of the page is
+            current, otherwise add validators to the response.
+        """
+        if name == 'ajax_lookup':
+            # Validated against the results, so the lookup runs only once
+            if request.method == 'GET':
+                after_this_request(self._make_lookup_conditional)
+
+            return None
+
+        version = self._get_request_version(name)
+
+        if version is None:
+            return None
+
+        token, last_modified = version
+        etag = hashlib.md5(repr((self.endpoint, request.full_path,
+                                 token)).encode('utf-8')).hexdigest()
+
+        def add_validators(response):
+            # Pages embed CSRF tokens and flashed messages, so the ETag is
+            # weak and browsers revalidate on every use
+            response.set_etag(etag, weak=True)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+
+            if last_modified is not None:
+                response.last_modified = last_modified
+
+            return response
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = (last_modified is not None and
+                            request.if_modified_since is not None and
+                            last_modified.replace(microsecond=0) <=
+                            request.if_modified_since)
+
+        if not_modified:
+            return add_validators(Response(status=304))
+
+        @after_this_request
+        def add_validators_if_ok(response):
+            if response.status_code == 200:
+                add_validators(response)
+
+            return response
+
+        return None
+
+    def _make_lookup_conditional(self, response):
+        """
+            Add a weak `ETag` digest of the AJAX lookup results to the
+            response, and answer `304 Not Modified` when the browser copy
+            has the same results.
+        """
+        if response.status_code != 200 or response.is_streamed:
+            return response
+
+        response.add_etag(weak=True)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+
+        return response.make_conditional(request)
+
+    def _run_view(self, fn, *args, **kwargs):
+        if (self._metrics_sink is None and self.query_count_budget is None and
+                self.query_time_budget is None):
+            return super(DjangoModelView, self)._run_view(fn, *args, **kwargs)
+
+        endpoint = '%s.%s' % (self.endpoint, fn.__name__)
+
+        action_name = request.form.get('action')
+        if fn.__name__ == 'action_view' and action_name:
+            endpoint = '%s.%s' % (endpoint, action_name)
+
+        with record_queries(endpoint) as stats:
+            response = super(DjangoModelView, self)._run_view(
+                fn, *args, **kwargs)
+
+        # Exports run their queries while the response is sent
+        if isinstance(response, Response) and response.is_streamed:
+            response.response = self._record_stream(response.response,
+                                                    stats)
+        else:
+            self._report_queries(stats)
+
+        return response
+
+    def _record_stream(self, iterable, stats):
+        """
+            Add statements run while streaming a response to the request
+            statistics and report them once the stream ends.
+        """
+        try:
+            with record_into(stats):
+                for chunk in iterable:
+                    yield chunk
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+
+            self._report_queries(stats)
+
+    def _report_queries(self, stats):
+        """
+            Publish query statistics of a request and warn when it is over
+            budget.
+        """
+        if self._metrics_sink is not None:
+            try:
+                self._metrics_sink.emit(stats)
+            except Exception:
+                log.exception('Failed to emit query metrics.')
+
+        over_count = (self.query_count_budget is not None and
+                      stats.queries > self.query_count_budget)
+        over_time = (self.query_time_budget is not None and
+                     stats.time > self.query_time_budget)
+
+        if over_count or over_time:
+            log.warning(
+                '%s is over the query budget: %d queries, %.1f ms. '
+                'Slowest:\n%s', stats.endpoint, stats.queries,
+                stats.time * 1000,
+                '\n'.join('%.1f ms: %s' % (duration * 1000, sql)
+                          for duration, sql in stats.get_slowest()))
+
+    def _refresh_filters_cache(self):
+        if self._scaffold_deferred:
+            return
+
+        super(DjangoModelView, self)._refresh_filters_cache()
+
+        self._facets = self.scaffold_facets()
+
+        # Filters joining to-many relations, which can duplicate rows
+        self._filter_multi_valued = set()
+
+        for idx, flt in enumerate(self._filters or ()):
+            column = getattr(flt, 'column', None)
+
+            if isinstance(column, string_types):
+                resolved = get_lookup_field(self.model, column)
+
+                if resolved is not None and resolved[2]:
+                    self._filter_multi_valued.add(idx)
+
+    def _refresh_form_rules_cache(self):
+        if not self._scaffold_deferred:
+            super(DjangoModelView, self)._refresh_form_rules_cache()
+
+    def _validate_form_class(self, ruleset, form_class, remove_missing=True):
+        if not self._scaffold_deferred:
+            super(DjangoModelView, self)._validate_form_class(
+                ruleset, form_class, remove_missing)
+
+    def _refresh_forms_cache(self):
+        if self._scaffold_deferred:
+            return
+
+        super(DjangoModelView, self)._refresh_forms_cache()
+
+        self._set_fields_form_class = self.scaffold_set_fields_form()
+
     def scaffold_inline_form_models(self, form_class):
         converter = self.model_form_converter(self)
         inline_converter = self.inline_model_form_converter(self)
@@ -188,35 +1062,384 @@ class DjangoModelView(BaseModelView):
 
     # AJAX foreignkey support
     def _create_ajax_loader(self, name, options):
-        return create_ajax_loader(self.model, name, name, options)
+        return create_ajax_loader(self.model, name, name,
+                                  self.get_ajax_loader_options(options))
+
+    def get_ajax_loader_options(self, options):
+        """
+            Return AJAX loader options with the read routing of the view
+            applied, unless the options set their own.
+
+            :param options:
+                Dictionary of loader options
+        """
+        result = {
+            'read_using': self.read_using,
+            'read_after_write_window': self.read_after_write_window,
+        }
+        result.update(options)
+        return result
+
+    def create_form(self, obj=None):
+        form = super(DjangoModelView, self).create_form(obj)
+        prefetch_ajax_data(form)
+        return form
+
+    def edit_form(self, obj=None):
+        if obj is not None:
+            prefetch_ajax_relations(self._form_ajax_refs, [obj])
+
+        form = super(DjangoModelView, self).edit_form(obj)
+        prefetch_ajax_data(form)
+        return form
 
     def get_query(self):
         """
         Returns the QuerySet for this view.  By default, it returns all the
         objects for the current model.
         """
-        return self.model.objects
+        return self.model.objects.all()
+
+    def get_read_alias(self):
+        """
+            Return the database alias for read-only queries of the current
+            request, or None for the default routing.
+        """
+        return get_read_alias(self.read_using, self.model,
+                              self.read_after_write_window)
+
+    def _using_read_alias(self, query):
+        alias = self.get_read_alias()
+        return query.using(alias) if alias else query
 
     def _search(self, query, search_term):
-        # TODO: Unfortunately, MongoEngine contains bug which
-        # prevents running complex Q queries and, as a result,
-        # Flask-Admin does not support per-word searching like
-        # in other backends
-        values = search_term.split(' ')
+        return self._search_backend.search(self, query, search_term)
+
+    def build_search_index(self, using=None):
+        """
+            Create or rebuild the index used by the search backend.
+
+            :param using:
+                Database alias
+        """
+        self.ensure_scaffolded()
+        self._search_backend.build_index(self, using=using)
+
+    def get_count(self, query, search, filters):
+        """
+            Return number of rows for the list view.
+
+            :param query:
+                Filtered and searched QuerySet
+            :param search:
+                Search criteria
+            :param filters:
+                List of applied filters
+        """
+        return self._count_strategy.count(self, query, search, filters)
+
+    def _count_within_timeout(self, query, search, filters):
+        """
+            Count rows within `query_timeout`. Returns None when the count
+            is cancelled.
+        """
+        try:
+            with statement_timeout(query.db, self.query_timeout):
+                return self.get_count(query, search, filters)
+        except DatabaseError as ex:
+            if not (self.query_timeout and is_timeout_error(ex)):
+                raise
+
+            log.warning('%s: count exceeded %ss, showing pager without total',
+                        self.endpoint, self.query_timeout)
+            return None
+
+    def _can_count_concurrently(self, query):
+        """
+            Return True if another connection sees the same rows as the
+            request thread.
+        """
+        connection = connections[query.db]
+
+        if connection.in_atomic_block:
+            return False
+
+        is_in_memory_db = getattr(connection, 'is_in_memory_db', None)
+        return not (is_in_memory_db is not None and is_in_memory_db())
+
+    def _wait_for_count(self, future, started):
+        """
+            Return the result of a concurrent count, or None when it misses
+            `count_timeout`.
+        """
+        timeout = None
+        if self.count_timeout is not None:
+            timeout = max(self.count_timeout - (time.time() - started), 0)
+
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            log.warning('%s: count exceeded %ss, showing pager without total',
+                        self.endpoint, self.count_timeout)
+            return None
+
+    def _get_projection_fields(self, names, select_related):
+        """
+            Return names of local model fields needed to render the
+            given columns.
+        """
+        result = set()
+
+        for name in names:
+            try:
+                field = self.model._meta.get_field(name.split('.', 1)[0])
+            except FieldDoesNotExist:
+                continue
+
+            if field.concrete and not field.many_to_many:
+                result.add(field.name)
+
+        for lookup in select_related:
+            result.add(lookup.split('__', 1)[0])
+
+        result.add(self.model._meta.pk.name)
+
+        return result
+
+    def _apply_projection(self, query, names, select_related, truncate=None):
+        """
+            Apply column projection and SQL truncation to a query.
+
+            :param query:
+                QuerySet
+            :param names:
+                Names of the rendered columns
+            :param select_related:
+                `select_related` lookups applied to the query
+            :param truncate:
+                Dictionary of column name to maximum length
+        """
+        truncate = truncate or {}
+        needed = self._get_projection_fields(names, select_related)
+
+        for name, length in truncate.items():
+            if name in needed and name != self.model._meta.pk.name:
+                query = query.annotate(**{
+                    self._get_truncated_alias(name): Substr(name, 1, length)
+                })
+                needed.discard(name)
+
+        if self.column_list_projection == 'only':
+            query = query.only(*needed)
+        elif self.column_list_projection == 'defer' or truncate:
+            deferred = [
+                field.name for field in self._get_model_fields()
+                if field.name not in needed and
+                (field.name in truncate or
+                 self.column_list_projection == 'defer' and
+                 field.get_internal_type() in self._deferred_field_types)
+            ]
+
+            if deferred:
+                query = query.defer(*deferred)
+
+        return query
+
+    def _get_column_paths(self, columns, formatters):
+        names = [name for name, _ in columns]
+
+        if formatters:
+            names.extend(name for name in formatters
+                         if isinstance(name, string_types) and
+                         name not in names)
+
+        return names
+
+    def _get_truncated_alias(self, name):
+        return '_truncated_%s' % name
+
+    def _get_field_value(self, model, name):
+        if self.column_max_length and name in self.column_max_length:
+            alias = self._get_truncated_alias(name)
+
+            if alias in model.__dict__:
+                return model.__dict__[alias]
+
+        return super(DjangoModelView, self)._get_field_value(model, name)
+
+    def _get_list_ordering(self, sort_column, sort_desc):
+        """
+            Return list of `(column, desc)` tuples to order the list by.
+        """
+        if sort_column:
+            return [(sort_column, bool(sort_desc))]
+
+        order = self._get_default_order()
+
+        if not order:
+            return []
+
+        if isinstance(order, tuple):
+            order = [order]
+
+        return [(column, bool(desc)) for column, desc in order]
+
+    def _order_by(self, query, ordering):
+        if not ordering:
+            return query
+
+        return query.order_by(*['%s%s' % ('-' if desc else '', column)
+                                for column, desc in ordering])
+
+    def _get_keyset_cursors(self):
+        if not hasattr(g, '_admin_keyset_cursors'):
+            g._admin_keyset_cursors = {}
+
+        return g._admin_keyset_cursors
+
+    def _get_keyset_page(self, query, ordering, page, page_size, state):
+        """
+            Fetch a page using a keyset cursor from the request, if it
+            matches the requested page and list state, and remember the
+            cursors leading to the adjacent pages.
+        """
+        keys = get_keyset_fields(self.model, ordering)
+
+        if keys is None:
+            return None
+
+        page = page or 0
+        direction = None
+
+        cursor = request.args.get(self.keyset_cursor_arg)
+        if cursor:
+            cursor = decode_cursor(cursor)
+
+            if cursor and cursor[0] == page and cursor[3] == state:
+                _, direction, values, _ = cursor
+
+                if direction not in ('next', 'prev') or len(values) != len(
+                        keys):
+                    direction = None
+
+        if direction is not None:
+            try:
+                values = [
+                    field.to_python(value)
+                    for (_, field, _), value in zip(keys, values)
+                ]
+            except ValidationError:
+                direction = None
+
+        forward = direction != 'prev'
+        query = self._order_by(
+            query, [(attname, desc == forward) for attname, _, desc in keys])
+
+        if direction is not None:
+            query = query.filter(get_seek_filter(keys, values, forward))
+            rows = list(query[:page_size])
+        else:
+            rows = list(query[page * page_size:(page + 1) * page_size])
+
+        if not forward:
+            rows.reverse()
+
+        self._remember_keyset_cursors(rows, keys, page, page_size, state)
+
+        return rows
+
+    def _remember_keyset_cursors(self, rows, keys, page, page_size, state):
+        """
+            Remember cursors leading from the page to the adjacent pages,
+            used by :meth:`_get_list_url` to build pager links.
+        """
+        page = page or 0
+        cursors = self._get_keyset_cursors()
+
+        if len(rows) == page_size:
+            values = [getattr(rows[-1], attname) for attname, _, _ in keys]
+            cursors[(self.endpoint, state, page + 1)] = encode_cursor(
+                page + 1, 'next', values, state)
+
+        if rows and page > 0:
+            values = [getattr(rows[0], attname) for attname, _, _ in keys]
+            cursors[(self.endpoint, state, page - 1)] = encode_cursor(
+                page - 1, 'prev', values, state)
+
+    def _get_list_url(self, view_args):
+        if self.pagination_mode != 'keyset':
+            return super(DjangoModelView, self)._get_list_url(view_args)
+
+        view_args = view_args.clone()
+        view_args.extra_args.pop(self.keyset_cursor_arg, None)
+
+        sort_column = self._get_column_by_idx(view_args.sort)
+        if sort_column is not None:
+            sort_column = sort_column[0]
+
+        state = get_list_state(sort_column, view_args.sort_desc,
+                               view_args.search, view_args.filters,
+                               view_args.page_size or self.page_size)
+
+        cursor = self._get_keyset_cursors().get(
+            (self.endpoint, state, view_args.page or 0))
+        if cursor:
+            view_args.extra_args[self.keyset_cursor_arg] = cursor
+
+        return super(DjangoModelView, self)._get_list_url(view_args)
+
+    def _get_list_query(self, search, filters):
+        """
+            Return the filtered and searched QuerySet, not sorted nor
+            paginated.
+        """
+        query = self._using_read_alias(self.get_query())
+
+        # Filters
+        if self._filters and filters:
+            query = self._apply_filters(query, filters)
+
+        # Search
+        if self._search_supported and search:
+            query = self._search(query, search)
+
+        return query
+
+    def _apply_filters(self, query, filters):
+        """
+            Apply filters as a single `filter()` call, so that conditions on
+            the same multi-valued relation share one join.
+
+            :param query:
+                QuerySet
+            :param filters:
+                List of `(index, name, value)` tuples of applied filters
+        """
         stmt = None
-        for value in values:
-            if not value:
+        distinct = False
+
+        for idx, flt_name, value in filters:
+            flt = self._filters[idx]
+            value = flt.clean(value)
+
+            # Filters overriding apply() can not be combined
+            if type(flt).apply is not BaseDjangoFilter.apply:
+                query = flt.apply(query, value)
                 continue
 
-            search_type, term = parse_like_term(value)
-            for field in self._search_fields:
-                q = Q(**{"{}__{}".format(field, search_type): term})
+            q = flt.get_q(value)
+            stmt = q if stmt is None else stmt & q
+
+            if idx in self._filter_multi_valued and not flt.negate:
+                distinct = True
+
+        if stmt is not None:
+            query = query.filter(stmt)
 
-                if stmt is None:
-                    stmt = q
-                else:
-                    stmt |= q
-        return query.filter(stmt)
+        if distinct and self.filter_distinct:
+            query = query.distinct()
+
+        return query
 
     def get_list(self,
                  page,
@@ -227,7 +1450,7 @@ class DjangoModelView(BaseModelView):
                  execute=True,
                  page_size=None):
         """
-            Get list of objects from MongoEngine
+            Get list of objects from Django
 
             :param page:
                 Page number
@@ -246,54 +1469,189 @@ class DjangoModelView(BaseModelView):
                 overriden to change the page_size limit. Removing the page_size
                 limit requires setting page_size to 0 or False.
         """
-        query = self.get_query()
+        self.ensure_scaffolded()
 
-        # Filters
-        if self._filters:
-            for flt, flt_name, value in filters:
-                sample_filter = self._filters[flt]
-                query = sample_filter.apply(query, sample_filter.clean(value))
+        if page_size is None:
+            page_size = self.page_size
 
-        # Search
-        if self._search_supported and search:
-            query = self._search(query, search)
+        ordering = self._get_list_ordering(sort_column, sort_desc)
+        state = get_list_state(sort_column, sort_desc, search, filters,
+                               page_size)
+        keyset = (self.pagination_mode == 'keyset' and execute and
+                  page_size and has_request_context())
 
-        # Get count
-        count = query.count() if not self.simple_list_pager else None
+        # Cached page
+        use_cache = self._list_cache is not None and execute and page_size
 
-        # Sorting
-        if sort_column:
-            query = query.order_by('%s%s' %
-                                   ('-' if sort_desc else '', sort_column))
+        if use_cache:
+            cached = self._list_cache.get(self, state, page)
+
+            if cached is not None:
+                count, pks = cached
+                rows = self._get_rows_by_pk(pks, ordering)
+
+                if keyset:
+                    keys = get_keyset_fields(self.model, ordering)
+
+                    if keys is not None:
+                        self._remember_keyset_cursors(rows, keys, page,
+                                                      page_size, state)
+
+                return count, rows
+
+        started = time.time()
+        query = self._get_list_query(search, filters)
+
+        # Get count
+        count = None
+        count_future = None
+
+        if self.simple_list_pager:
+            pass
+        elif (self._count_executor is not None and execute and
+              self._can_count_concurrently(query)):
+            count_future = submit_count(self._count_executor,
+                                        self._count_within_timeout,
+                                        query, search, filters)
         else:
-            order = self._get_default_order()
+            count = self._count_within_timeout(query, search, filters)
+
+        query = self._apply_list_loading(query, ordering)
+
+        if not execute:
+            query = self._order_by(query, ordering)
+
+            # Pagination
+            if page_size:
+                offset = (page or 0) * page_size
+                query = query[offset:offset + page_size]
+
+            return count, query
+
+        try:
+            with statement_timeout(query.db, self.query_timeout):
+                rows = self._get_page(query, ordering, page, page_size,
+                                      state, keyset)
+        except DatabaseError as ex:
+            if not (self.query_timeout and is_timeout_error(ex) and
+                    has_request_context()):
+                raise
+
+            log.warning('%s: list query exceeded %ss', self.endpoint,
+                        self.query_timeout)
+            flash(gettext('The list took too long to load. Please narrow '
+                          'your search or add filters.'), 'error')
+            return None, []
+
+        if count_future is not None:
+            count = self._wait_for_count(count_future, started)
+
+        if use_cache and (count is not None or self.simple_list_pager):
+            self._list_cache.set(self, state, page, count,
+                                 [row.pk for row in rows])
+
+        return count, rows
+
+    def _get_page(self, query, ordering, page, page_size, state, keyset):
+        """
+            Fetch rows of the list page, with a keyset cursor if possible.
+        """
+        rows = None
+
+        # Keyset pagination
+        if keyset:
+            rows = self._get_keyset_page(query, ordering, page, page_size,
+                                         state)
+
+        if rows is None:
+            query = self._order_by(query, ordering)
+
+            # Pagination
+            if page_size:
+                offset = (page or 0) * page_size
+                query = query[offset:offset + page_size]
 
-            if order:
-                query = query.order_by('%s%s' %
-                                       ('-' if order[1] else '', order[0]))
-        # Pagination
-        page_size = self.page_size
-        paginator = Paginator(query, page_size)
+            rows = list(query)
 
-        if page_size:
-            query = paginator.object_list
-            
-        if page and page_size:
-            query = paginator.page(page).object_list
+        return rows
 
-        if execute:
-            query = query.all()
+    def _apply_list_loading(self, query, ordering):
+        """
+            Apply related model loading and column projection of the list
+            view to the query.
+        """
+        # Related models
+        if self._select_related:
+            query = query.select_related(*self._select_related)
+
+        if self._prefetch_related:
+            query = query.prefetch_related(*self._prefetch_related)
+
+        # Projection
+        truncate = dict(
+            (name, length)
+            for name, length in (self.column_max_length or {}).items()
+            if name not in self.column_editable_list and
+            name not in (self.column_formatters or {}))
 
-        return count, query
+        names = self._get_column_paths(self._list_columns,
+                                       self.column_formatters)
+        names.extend(column for column, _ in ordering)
+
+        return self._apply_projection(query, names, self._select_related,
+                                      truncate)
+
+    def _get_rows_by_pk(self, pks, ordering):
+        """
+            Load list rows by primary key, preserving the order of `pks`.
+        """
+        query = self._apply_list_loading(
+            self._using_read_alias(self.get_query()).filter(pk__in=pks),
+            ordering)
+
+        rows = dict((row.pk, row) for row in query)
+        return [rows[pk] for pk in pks if pk in rows]
+
+    def invalidate_list_cache(self):
+        """
+            Invalidate cached list pages of the view model.
+        """
+        if self._list_cache is not None:
+            self._list_cache.invalidate(self.model)
 
     def get_one(self, _id):
         """
-            Return a single model instance by its ID
+            Return a single model instance by its ID. The details page reads
+            it from `read_using`, other pages from the default database as
+            they may write it back.
 
             :param id:
                 Model ID
         """
-        return self.get_query().filter(pk=_id).first()
+        return self._get_one_query().filter(pk=_id).first()
+
+    def _get_one_query(self):
+        query = self.get_query()
+
+        if (has_request_context() and
+                request.endpoint == '%s.details_view' % self.endpoint):
+            query = self._using_read_alias(query)
+
+        return query
+
+    def get_version(self, _id):
+        """
+            Return `(pk, version)` tuple of a record, fetching only these
+            two columns, or None if it does not exist.
+
+            :param id:
+                Model ID
+        """
+        try:
+            return self._get_one_query().filter(pk=_id).values_list(
+                'pk', self.version_field).first()
+        except (ValueError, TypeError, ValidationError):
+            return None
 
     def create_model(self, form):
         """
@@ -306,7 +1664,10 @@ class DjangoModelView(BaseModelView):
             model = self.model()
             form.populate_obj(model)
             self._on_model_change(form, model, True)
-            model.save()
+
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                model.save()
+                save_inline(form, model)
         except Exception as ex:
             if not self.handle_view_exception(ex):
                 flash(
@@ -318,6 +1679,8 @@ class DjangoModelView(BaseModelView):
 
             return False
         else:
+            self.invalidate_list_cache()
+            mark_write()
             self.after_model_change(form, model, True)
 
         return model
@@ -334,7 +1697,10 @@ class DjangoModelView(BaseModelView):
         try:
             form.populate_obj(model)
             self._on_model_change(form, model, False)
-            model.save()
+
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                model.save()
+                save_inline(form, model)
         except Exception as ex:
             if not self.handle_view_exception(ex):
                 flash(
@@ -346,6 +1712,8 @@ class DjangoModelView(BaseModelView):
 
             return False
         else:
+            self.invalidate_list_cache()
+            mark_write()
             self.after_model_change(form, model, False)
 
         return True
@@ -371,16 +1739,148 @@ class DjangoModelView(BaseModelView):
 
             return False
         else:
+            self.invalidate_list_cache()
+            mark_write()
             self.after_model_delete(model)
 
         return True
 
+    # Export
+    def get_export_query(self, sort_column, sort_desc, search, filters):
+        """
+            Return QuerySet with the rows to export, honouring current
+            filters, search, sorting and `column_export_list`.
+
+            :param sort_column:
+                Sort column
+            :param sort_desc:
+                Sort descending
+            :param search:
+                Search criteria
+            :param filters:
+                List of applied filters
+        """
+        query = self._get_list_query(search, filters)
+
+        names = self._get_column_paths(self._export_columns,
+                                       self.column_formatters_export)
+        select, prefetch = self._get_joins(self._export_columns,
+                                           self.column_formatters_export)
+
+        if select:
+            query = query.select_related(*select)
+
+        if prefetch:
+            query = query.prefetch_related(*prefetch)
+
+        query = self._apply_projection(query, names, select)
+        query = self._order_by(
+            query, self._get_list_ordering(sort_column, sort_desc))
+
+        if self.export_max_rows:
+            query = query[:self.export_max_rows]
+
+        return query
+
+    def _export_data(self):
+        # Macros in column_formatters are not supported.
+        # Macros will have a function name 'inner'
+        # This causes non-macro functions named 'inner' not work.
+        export_names = [col for col, _ in self._export_columns]
+
+        for col, func in self.column_formatters_export.items():
+            if col in export_names and func.__name__ == 'inner':
+                raise NotImplementedError(
+                    'Macros are not implemented in export. Exclude column in'
+                    ' column_formatters_export, column_export_list, or '
+                    ' column_export_exclude_list. Column: %s' % (col, ))
+
+        # Grab parameters from URL
+        view_args = self._get_list_extra_args()
+
+        # Map column index to column name
+        sort_column = self._get_column_by_idx(view_args.sort)
+        if sort_column is not None:
+            sort_column = sort_column[0]
+
+        query = self.get_export_query(sort_column, view_args.sort_desc,
+                                      view_args.search, view_args.filters)
+
+        # Rows are streamed, so the total is not counted
+        return None, query.iterator(chunk_size=self.export_chunk_size)
+
+    def _export_tablib(self, export_type, return_url):
+        # Formats other than CSV land here, after the export checks
+        if export_type == 'ndjson':
+            return self._export_ndjson(return_url)
+
+        return super(DjangoModelView, self)._export_tablib(export_type,
+                                                           return_url)
+
+    def _export_ndjson(self, return_url):
+        """
+            Export newline-delimited JSON of records as a stream.
+        """
+        count, data = self._export_data()
+
+        encoder = ExportJSONEncoder()
+
+        def generate():
+            for row in data:
+                yield encoder.encode(
+                    dict((name, self.get_export_value(row, name))
+                         for name, _ in self._export_columns)) + '\n'
+
+        filename = self.get_export_name(export_type='ndjson')
+
+        disposition = 'attachment;filename=%s' % (secure_filename(filename),)
+
+        return Response(
+            stream_with_context(generate()),
+            headers={'Content-Disposition': disposition},
+            mimetype='application/x-ndjson')
+
     # Default model actions
+    def _delete_chunk(self, ids, using):
+        """
+            Delete records of one chunk of the delete action and return
+            the number of deleted records.
+
+            :param ids:
+                List of primary keys
+            :param using:
+                Database alias the chunk transaction runs on
+        """
+        query = self.get_query().filter(pk__in=ids)
+
+        if self.fast_mass_delete:
+            # Single DELETE statement when there are no signal receivers
+            # and all relations cascade in the database
+            if Collector(using=using).can_fast_delete(query):
+                return query._raw_delete(using)
+
+            _, deleted = query.delete()
+            return deleted.get(self.model._meta.label, 0)
+
+        count = 0
+
+        for obj in query.iterator():
+            # Savepoint per record, a failed delete is reported by
+            # delete_model and must not abort the rest of the chunk
+            with transaction.atomic(using=using):
+                count += self.delete_model(obj)
+
+        return count
+
     def is_action_allowed(self, name):
         # Check delete action permission
         if name == 'delete' and not self.can_delete:
             return False
 
+        if name == 'set_fields' and (not self.can_edit or
+                                     self._set_fields_form_class is None):
+            return False
+
         return super(DjangoModelView, self).is_action_allowed(name)
 
     @action('delete',
@@ -388,12 +1888,17 @@ class DjangoModelView(BaseModelView):
             lazy_gettext('Are you sure you want to delete selected records?'))
     def action_delete(self, ids):
         try:
-            if self.fast_mass_delete:
-                count, _ = self.get_query().filter(pk__in=ids).delete()
-            else:
-                count = 0
-                for obj in self.get_query().filter(pk__in=ids).all():
-                    count += self.delete_model(obj)
+            using = router.db_for_write(self.model)
+            size = self.action_delete_chunk_size or len(ids) or 1
+            count = 0
+
+            for start in range(0, len(ids), size):
+                with transaction.atomic(using=using):
+                    count += self._delete_chunk(ids[start:start + size],
+                                                using)
+
+            self.invalidate_list_cache()
+            mark_write()
 
             flash(
                 ngettext(
@@ -408,3 +1913,119 @@ class DjangoModelView(BaseModelView):
                     gettext(
                         'Failed to delete records. %(error)s', error=str(ex)),
                     'error')
+
+    def _update_chunk(self, ids, values, form, using):
+        """
+            Apply values of the "Set fields" action to one chunk of records
+            and return the number of updated records.
+
+            :param ids:
+                List of primary keys
+            :param values:
+                Dictionary of field name to new value
+            :param form:
+                Validated form holding only the fields being set
+            :param using:
+                Database alias the chunk transaction runs on
+        """
+        query = self.get_query().filter(pk__in=ids)
+
+        if not self.action_set_fields_per_object:
+            return query.update(**self._touch_values(values))
+
+        count = 0
+
+        for obj in query.iterator():
+            with transaction.atomic(using=using):
+                count += self.update_model(form, obj)
+
+        return count
+
+    def _touch_values(self, values):
+        """
+            Return update values with the `auto_now` fields that are not
+            set already, as `QuerySet.update()` does not call `pre_save()`.
+        """
+        result = dict(values)
+        now = timezone.now()
+
+        for field in self.model._meta.concrete_fields:
+            if (not getattr(field, 'auto_now', False) or
+                    field.name in result or field.attname in result):
+                continue
+
+            if isinstance(field, django_fields.DateTimeField):
+                result[field.attname] = now
+            elif isinstance(field, django_fields.DateField):
+                result[field.attname] = datetime.date.today()
+            else:
+                result[field.attname] = datetime.datetime.now().time()
+
+        return result
+
+    @action('set_fields', lazy_gettext('Set fields'))
+    def action_set_fields(self, ids):
+        return_url = get_redirect_target() or self.get_url('.index_view')
+
+        if '_set_fields' not in request.form:
+            form = self._set_fields_form_class()
+            return self._render_set_fields(form, ids, return_url)
+
+        form = self._set_fields_form_class(request.form)
+
+        # Only validate and write the enabled fields
+        names = []
+
+        for name in self.action_set_fields_list:
+            toggle = 'set_%s' % name
+
+            if form[toggle].data:
+                names.append(name)
+            else:
+                del form[name]
+
+            del form[toggle]
+
+        if not names:
+            flash(gettext('Select at least one field to set.'), 'error')
+            return self._render_set_fields(form, ids, return_url)
+
+        if not form.validate():
+            return self._render_set_fields(form, ids, return_url)
+
+        try:
+            values = dict((name, form[name].data) for name in names)
+            using = router.db_for_write(self.model)
+            size = self.action_update_chunk_size or len(ids) or 1
+            count = 0
+
+            for start in range(0, len(ids), size):
+                with transaction.atomic(using=using):
+                    count += self._update_chunk(ids[start:start + size],
+                                                values, form, using)
+
+            self.invalidate_list_cache()
+            mark_write()
+
+            flash(
+                ngettext(
+                    'Record was successfully saved.',
+                    '%(count)s records were successfully saved.',
+                    count,
+                    count=count),
+                'success')
+        except Exception as ex:
+            if not self.handle_view_exception(ex):
+                flash(
+                    gettext(
+                        'Failed to update records. %(error)s',
+                        error=format_error(ex)),
+                    'error')
+                log.exception('Failed to update records.')
+
+    def _render_set_fields(self, form, ids, return_url):
+        template = (self.action_set_fields_template or
+                    current_app.jinja_env.from_string(SET_FIELDS_TEMPLATE))
+
+        return self.render(template, form=form, ids=ids,
+                           return_url=return_url)